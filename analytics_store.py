@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+
+# Constants
+ANALYTICS_DB = "data/analytics.db"
+LEGACY_ANALYTICS_FILE = "data/analytics.json"
+FLUSH_EVERY = 20  # pending events
+FLUSH_INTERVAL = 5.0  # seconds
+DEFAULT_COUNTERS = {"questions": 0, "bias_detected": 0, "feedback_positive": 0, "feedback_negative": 0}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    session TEXT,
+    kind TEXT NOT NULL,
+    query TEXT,
+    latency_ms REAL,
+    sources TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS events_kind_ts ON events (kind, ts);
+"""
+
+
+class AnalyticsStore:
+    """Analytics backed by SQLite in WAL mode.
+
+    Counter increments and events are buffered in memory and written in one
+    transaction every FLUSH_EVERY events or FLUSH_INTERVAL seconds. Counters
+    are updated with `value = value + delta`, so concurrent processes never
+    lose increments the way read-modify-write of analytics.json did.
+    """
+    def __init__(self, path=ANALYTICS_DB, legacy_file=LEGACY_ANALYTICS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending_counters = {}
+        self.pending_events = []
+        self.last_flush = time.time()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._import_legacy(legacy_file)
+        atexit.register(self.flush)
+
+    def _import_legacy(self, legacy_file):
+        """Seed the counters from analytics.json the first time the database is created"""
+        with self.lock:
+            if self.connection.execute("SELECT COUNT(*) FROM counters").fetchone()[0]:
+                return
+            counters = dict(DEFAULT_COUNTERS)
+            if legacy_file and os.path.exists(legacy_file):
+                try:
+                    with open(legacy_file, 'r') as f:
+                        counters.update(json.load(f))
+                except json.JSONDecodeError:
+                    pass
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO counters (name, value) VALUES (?, ?)", counters.items()
+                )
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.pending_counters[name] = self.pending_counters.get(name, 0) + amount
+        self._maybe_flush()
+
+    def record_event(self, kind, session=None, query=None, latency_ms=None, sources=None, value=None):
+        with self.lock:
+            self.pending_events.append((
+                time.time(), session, kind, query, latency_ms,
+                json.dumps(sources) if sources is not None else None,
+                json.dumps(value) if value is not None else None,
+            ))
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self.pending_events) >= FLUSH_EVERY or time.time() - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Write buffered counters and events in a single transaction"""
+        with self.lock:
+            counters, self.pending_counters = self.pending_counters, {}
+            events, self.pending_events = self.pending_events, []
+            self.last_flush = time.time()
+            if not counters and not events:
+                return
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    counters.items(),
+                )
+                self.connection.executemany(
+                    "INSERT INTO events (ts, session, kind, query, latency_ms, sources, value) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    events,
+                )
+
+    def get_counters(self):
+        """Current counter totals, including increments not yet flushed"""
+        with self.lock:
+            counters = dict(DEFAULT_COUNTERS)
+            counters.update(self.connection.execute("SELECT name, value FROM counters").fetchall())
+            for name, amount in self.pending_counters.items():
+                counters[name] = counters.get(name, 0) + amount
+            return counters
+
+    def recent_events(self, kind=None, limit=100):
+        """Most recent flushed events as dicts, newest first"""
+        query = "SELECT ts, session, kind, query, latency_ms, sources, value FROM events"
+        params = []
+        if kind is not None:
+            query += " WHERE kind = ?"
+            params.append(kind)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+        return [
+            {
+                "ts": ts, "session": session, "kind": event_kind, "query": text, "latency_ms": latency_ms,
+                "sources": json.loads(sources) if sources else None,
+                "value": json.loads(value) if value else None,
+            }
+            for ts, session, event_kind, text, latency_ms, sources, value in rows
+        ]
+
+    def question_counts(self, since=None):
+        """(query, count) of every flushed question since a timestamp, most asked first.
+
+        A follow-up counts under the standalone query it was answered as.
+        """
+        query = ("SELECT query, value, COUNT(*) FROM events WHERE kind = 'question' AND ts >= ? "
+                 "GROUP BY query, value")
+        with self.lock:
+            rows = self.connection.execute(query, (since or 0,)).fetchall()
+        counts = {}
+        for text, value, count in rows:
+            value = json.loads(value) if value else None
+            text = value.get("standalone") if isinstance(value, dict) and value.get("standalone") else text
+            if text:
+                counts[text] = counts.get(text, 0) + count
+        return sorted(counts.items(), key=lambda item: -item[1])
+
+    def record_question(self, session, query, latency_ms, sources, standalone=None):
+        self.increment("questions")
+        value = {"standalone": standalone} if standalone and standalone != query else None
+        self.record_event("question", session=session, query=query, latency_ms=latency_ms, sources=sources,
+                          value=value)
+
+    def record_bias(self, session, query):
+        self.increment("bias_detected")
+        self.record_event("bias", session=session, query=query)
+
+    def record_feedback(self, session, query, positive):
+        self.increment("feedback_positive" if positive else "feedback_negative")
+        self.record_event("feedback", session=session, query=query, value=positive)
@@ -0,0 +1,157 @@
+import math
+import numpy as np
+import faiss
+
+# Constants
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "binary")
+QUANTIZED_TYPES = ("sq8", "binary")
+DEFAULT_NPROBE = 16
+DEFAULT_PQ_M = 48  # sub-quantizers; the embedding dimension must be divisible by it
+DEFAULT_PQ_NBITS = 8
+DEFAULT_HNSW_M = 32
+DEFAULT_EF_SEARCH = 64
+DEFAULT_EF_CONSTRUCTION = 80
+MIN_POINTS_PER_CENTROID = 39  # faiss warns below this many training points per centroid
+# Candidates fetched per requested result before rescoring with the float vectors
+DEFAULT_RESCORE_FACTORS = {"sq8": 4, "binary": 20}
+
+
+def default_nlist(n):
+    """Number of IVF lists: ~4*sqrt(n), limited so every list gets enough training points"""
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_CENTROID))
+
+
+def estimate_memory_bytes(index_type, n, d, nlist=None, pq_m=DEFAULT_PQ_M, pq_nbits=DEFAULT_PQ_NBITS,
+                          hnsw_m=DEFAULT_HNSW_M):
+    """Rough resident size of an index holding n vectors of dimension d.
+
+    For the quantized types this is only the codes every search scans. Their
+    index file also stores the float vectors used for rescoring (another
+    n * d * 4 bytes), memory-mapped, so only candidate rows are read.
+    """
+    nlist = nlist or default_nlist(n)
+    if index_type == "flat":
+        return n * d * 4
+    if index_type == "sq8":
+        return n * d + d * 8
+    if index_type == "binary":
+        return n * d // 8 + d * 4
+    if index_type == "ivf_flat":
+        return n * (d * 4 + 8) + nlist * d * 4
+    if index_type == "ivf_pq":
+        return n * (pq_m * pq_nbits // 8 + 8) + nlist * d * 4 + pq_m * (2 ** pq_nbits) * (d // pq_m) * 4
+    if index_type == "hnsw":
+        # Level-0 links take 2*M neighbours, upper levels add roughly another 10%
+        return n * (d * 4 + int(hnsw_m * 2 * 4 * 1.1))
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+def is_flat(index):
+    return isinstance(index, faiss.IndexFlat)
+
+
+def quantized_type(index):
+    """"sq8" or "binary" for a quantized index with rescoring, None for any other index"""
+    if not isinstance(index, faiss.IndexRefine):
+        return None
+    base = faiss.downcast_index(index.base_index)
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if isinstance(base, faiss.IndexLSH):
+        return "binary"
+    return None
+
+
+def build_ann_index(vectors, index_type, nlist=None, nprobe=DEFAULT_NPROBE, pq_m=DEFAULT_PQ_M,
+                    pq_nbits=DEFAULT_PQ_NBITS, hnsw_m=DEFAULT_HNSW_M, ef_search=DEFAULT_EF_SEARCH,
+                    ef_construction=DEFAULT_EF_CONSTRUCTION, rescore_factor=None):
+    """Build (and train if needed) an L2 index of the requested type over the vectors.
+
+    Vectors are added in order, so row i of `vectors` keeps position i and the
+    vectorstore's index_to_docstore_id mapping stays valid. The quantized
+    types scan int8 (sq8) or one-bit-per-dimension (binary) codes, then
+    rescore the best k * rescore_factor candidates with their float vectors,
+    so returned distances are exact.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    if index_type == "ivf_pq" and (d % pq_m or n < MIN_POINTS_PER_CENTROID * 2 ** pq_nbits):
+        print(f"ivf_pq needs d divisible by {pq_m} and at least {MIN_POINTS_PER_CENTROID * 2 ** pq_nbits} "
+              f"vectors to train; using ivf_flat for {n} vectors.")
+        index_type = "ivf_flat"
+    if index_type in ("ivf_flat", "ivf_pq") and n < MIN_POINTS_PER_CENTROID:
+        print(f"Too few vectors ({n}) to train an IVF index; using flat.")
+        index_type = "flat"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(d)
+    elif index_type in QUANTIZED_TYPES:
+        if index_type == "sq8":
+            codes = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit)
+        else:
+            # Sign bits around each dimension's median; searched by Hamming distance
+            codes = faiss.IndexLSH(d, d, False, True)
+        codes.train(vectors)
+        index = faiss.IndexRefineFlat(codes)
+        index.k_factor = rescore_factor or DEFAULT_RESCORE_FACTORS[index_type]
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        index.hnsw.efSearch = ef_search
+    else:
+        nlist = min(nlist or default_nlist(n), max(1, n // MIN_POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatL2(d)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m, pq_nbits)
+        index.train(vectors)
+        index.nprobe = min(nprobe, nlist)
+
+    index.add(vectors)
+    return index
+
+
+def set_search_params(index, nprobe=None, ef_search=None, rescore_factor=None):
+    """Tune the recall/latency trade-off of an already built index"""
+    if isinstance(index, faiss.IndexRefine):
+        if rescore_factor is not None:
+            index.k_factor = rescore_factor
+        return
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW) and ef_search is not None:
+        index.hnsw.efSearch = ef_search
+
+
+def flat_vectors(index):
+    """All vectors of a flat index, in position order"""
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def built_index_type(index):
+    """The INDEX_TYPES name of an index; build_ann_index may have fallen back from the requested one"""
+    if quantized_type(index):
+        return quantized_type(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return "ivf_pq" if isinstance(ivf, faiss.IndexIVFPQ) else "ivf_flat"
+    return "flat"
+
+
+def describe_index(index):
+    kind = built_index_type(index)
+    if kind in QUANTIZED_TYPES:
+        return f"{kind} (rescore x{index.k_factor:g})"
+    if kind == "hnsw":
+        return f"hnsw (M={index.hnsw.nb_neighbors(1)}, efSearch={index.hnsw.efSearch})"
+    if kind in ("ivf_flat", "ivf_pq"):
+        ivf = faiss.try_extract_index_ivf(index)
+        return f"{kind} (nlist={ivf.nlist}, nprobe={ivf.nprobe})"
+    return "flat"
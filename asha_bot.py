@@ -1,30 +1,59 @@
 import os
+import uuid
 import streamlit as st
-import json
 import time
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.chains import RetrievalQA
-from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import PromptTemplate
 from langchain_huggingface import HuggingFaceEndpoint
 import styles  # Import the styles module
+from connect_memory_with_llm import APP_PROMPT_TEMPLATE, build_qa_chain, configure_http_pool, stream_answer
+from semantic_cache import SemanticCache
+from faq_index import FaqIndex
+from embedding_service import get_query_embedder
+from index_refresh import RefreshJob, ServedIndex
+from conversation_memory import ConversationMemory
+from analytics_store import AnalyticsStore
+from bias_filter import OUTPUT_BLOCKED_MESSAGE, detect_bias, output_screen, screen_output
+import tracing
 
 DB_FAISS_PATH = "vectorstore/db_faiss"
+ANALYTICS_DB = "data/analytics.db"
 ANALYTICS_FILE = "data/analytics.json"
+HUGGINGFACE_REPO_ID = "mistralai/Mistral-7B-Instruct-v0.3"
+RETRIEVER_K = 5
+STREAM_ANSWERS = True
+STREAM_RENDER_INTERVAL = 0.05  # seconds between re-renders while streaming
+TRACE_PANEL_TURNS = 10
+REFRESH_POLL_SECONDS = 2
 
-BIAS_KEYWORDS = ["bad women", "inferior", "weak", "should not work", "can't work", "unsuitable for women"]
+@st.cache_resource
+def get_served_index():
+    """The index version answering queries; a knowledge-base refresh swaps it in place"""
+    def build_chain(vectorstore, db_path):
+        llm = load_llm(huggingface_repo_id=HUGGINGFACE_REPO_ID, HF_TOKEN=os.environ.get("HF_TOKEN"))
+        return build_qa_chain(llm, vectorstore, RETRIEVER_K, APP_PROMPT_TEMPLATE, db_path)
+    return ServedIndex(build_chain, DB_FAISS_PATH)
+
+@st.cache_resource
+def get_refresh_job():
+    """One background refresh per process, shared by all sessions"""
+    return RefreshJob(get_served_index())
 
 @st.cache_resource
-def get_vectorstore():
-    embedding_model = HuggingFaceEmbeddings(model_name='sentence-transformers/paraphrase-MiniLM-L6-v2')
-    db = FAISS.load_local(DB_FAISS_PATH, embedding_model, allow_dangerous_deserialization=True)
-    return db
+def get_semantic_cache():
+    """Share one semantic answer cache across sessions; it clears itself when a refresh swaps the index"""
+    return SemanticCache(get_query_embedder(), db_path=DB_FAISS_PATH)
+
+@st.cache_resource
+def get_faq_index():
+    """Precomputed answers to the most frequent queries, written by build_faq_index.py"""
+    return FaqIndex(APP_PROMPT_TEMPLATE)
 
 def set_custom_prompt(custom_prompt_template):
     prompt = PromptTemplate(template=custom_prompt_template, input_variables=["context", "question"])
     return prompt
 
 def load_llm(huggingface_repo_id, HF_TOKEN):
+    configure_http_pool()
     llm = HuggingFaceEndpoint(
         repo_id=huggingface_repo_id,
         temperature=0.5,
@@ -33,19 +62,72 @@ def load_llm(huggingface_repo_id, HF_TOKEN):
     )
     return llm
 
-def detect_bias(prompt):
-    prompt = prompt.lower()
-    return any(keyword in prompt for keyword in BIAS_KEYWORDS)
+def get_served():
+    """The index version currently being served: its vectorstore and RetrievalQA chain"""
+    return get_served_index().current
+
+@st.cache_resource
+def get_analytics_store():
+    """One buffered analytics writer per process, shared by all sessions"""
+    return AnalyticsStore(ANALYTICS_DB, legacy_file=ANALYTICS_FILE)
 
-def load_analytics():
-    if not os.path.exists(ANALYTICS_FILE):
-        return {"questions": 0, "bias_detected": 0, "feedback_positive": 0, "feedback_negative": 0}
-    with open(ANALYTICS_FILE, "r") as f:
-        return json.load(f)
+def format_sources(source_documents):
+    """Render the unique sources of the retrieved documents as an html block"""
+    with tracing.span("format_sources"):
+        unique_sources = []
+        for doc in source_documents:
+            source = doc.metadata.get('source', 'Unknown')
+            if source not in unique_sources:
+                unique_sources.append(source)
+        if not unique_sources:
+            return ""
+        return f"\n\n<div class='sources'><strong>Sources:</strong><br/>{'<br/>'.join(unique_sources)}</div>"
 
-def save_analytics(analytics):
-    with open(ANALYTICS_FILE, "w") as f:
-        json.dump(analytics, f, indent=4)
+def render_trace_panel():
+    """Admin view of where the time went in recent chat turns"""
+    with st.expander("⏱️ Turn timings (admin)"):
+        enabled = st.checkbox("Record turn timings", value=tracing.is_enabled(),
+                              help="Time embedding, search, the LLM call and rendering for every turn")
+        if enabled != tracing.is_enabled():
+            tracing.set_enabled(enabled)
+        turns = [turn for turn in tracing.recent_turns(limit=TRACE_PANEL_TURNS) if turn["name"] == "chat_turn"]
+        if not turns:
+            st.caption("No traced turns yet." if enabled else "Tracing is off.")
+            return
+        rows = []
+        for turn in turns:
+            row = {
+                "time": time.strftime("%H:%M:%S", time.localtime(turn["ts"])),
+                "query": turn["attributes"].get("query", ""),
+                "total ms": round(turn["duration_ms"]),
+            }
+            for item in turn["spans"]:
+                column = f"{item['name']} ms"
+                row[column] = round(row.get(column, 0) + item["duration_ms"], 1)
+            rows.append(row)
+        st.dataframe(rows, hide_index=True)
+
+def render_refresh_status():
+    """Progress of the background knowledge-base refresh; polls itself while one is running"""
+    job = get_refresh_job()
+    status = job.status
+    if status["state"] == "running":
+        st.progress(min(1.0, status["fraction"]), text=status["message"])
+    elif status["state"] == "done":
+        st.success(status["message"])
+    elif status["state"] == "failed":
+        st.error(f"{status['message']} ({status['error']})")
+    # The fragment stops polling on the full rerun that follows a finished refresh
+    if st.session_state.get("refresh_polling") and not job.running:
+        st.session_state.refresh_polling = False
+        st.rerun()
+
+def assistant_message_html(content):
+    return f"""
+    <div class="assistant-message">
+        <strong>Asha:</strong> {content}
+    </div>
+    """
 
 def create_custom_header():
     st.markdown(styles.HEADER_HTML, unsafe_allow_html=True)
@@ -64,7 +146,11 @@ def main():
     create_custom_header()
     
     # Stats Container
-    analytics = load_analytics()
+    analytics_store = get_analytics_store()
+    analytics = analytics_store.get_counters()
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    session_id = st.session_state.session_id
     
     # Welcome message
     if 'first_time' not in st.session_state:
@@ -101,7 +187,13 @@ def main():
             """, unsafe_allow_html=True)
         
         # Refresh Button
-        st.button("🔄 Refresh Knowledge Base", key="refresh_kb", help="Update Asha's knowledge with the latest information")
+        if st.button("🔄 Refresh Knowledge Base", key="refresh_kb", help="Update Asha's knowledge with the latest information"):
+            if not get_refresh_job().start():
+                st.info("A refresh is already running.")
+        st.session_state.refresh_polling = get_refresh_job().running
+        st.fragment(render_refresh_status, run_every=REFRESH_POLL_SECONDS if st.session_state.refresh_polling else None)()
+
+        render_trace_panel()
     
     with col1:
         # Chat container
@@ -112,8 +204,9 @@ def main():
             st.session_state.messages = [
                 {'role': 'assistant', 'content': "Hello! I'm Asha, your AI career assistant. How can I help you with your professional journey today?"}
             ]
-        if 'history' not in st.session_state:
-            st.session_state.history = []
+        if 'memory' not in st.session_state:
+            # Rolling summary of the conversation; stays the same size however long the chat runs
+            st.session_state.memory = ConversationMemory()
 
         # Display chat messages
         for message in st.session_state.messages:
@@ -137,7 +230,7 @@ def main():
             if prompt:
                 if detect_bias(prompt):
                     st.warning("⚠️ Asha promotes positive and empowering conversations!")
-                    analytics["bias_detected"] += 1
+                    analytics_store.record_bias(session_id, prompt)
                 else:
                     st.session_state.messages.append({'role': 'user', 'content': prompt})
                     st.markdown(f"""
@@ -146,84 +239,93 @@ def main():
                     </div>
                     """, unsafe_allow_html=True)
 
-                    with st.spinner("Asha is thinking..."):
+                    turn_start = time.time()
+                    with tracing.turn("chat_turn", session=session_id[:8], query=prompt[:60]) as trace_turn:
                         try:
-                            # Load vector store
-                            vectorstore = get_vectorstore()
-                            
-                            HF_TOKEN = os.environ.get("HF_TOKEN")
-                            HUGGINGFACE_REPO_ID = "mistralai/Mistral-7B-Instruct-v0.3"
-
-                            CUSTOM_PROMPT_TEMPLATE = """
-                            You are Asha, an AI chatbot focused on women empowerment and career development.
-                            Always start your answer with a short encouraging line like "Let's explore some opportunities!" or "Here's what I found to help you!"
-
-                            Use the context provided to suggest specific job roles, mentorship programs, or events related to women's careers.
-                            If detailed information is missing, politely guide the user to visit https://www.herkey.com/jobs for updated listings.
-
-                            Context: {context}
-                            Question: {question}
-
-                            Keep your tone supportive, encouraging, and career-focused. 
-                            Never invent fake job titles if not found.
-                            """
-
-                            qa_chain = RetrievalQA.from_chain_type(
-                                llm=load_llm(huggingface_repo_id=HUGGINGFACE_REPO_ID, HF_TOKEN=HF_TOKEN),
-                                chain_type="stuff",
-                                retriever=vectorstore.as_retriever(search_kwargs={'k': 5}),
-                                return_source_documents=True,
-                                verbose=False,
-                                chain_type_kwargs={'prompt': set_custom_prompt(CUSTOM_PROMPT_TEMPLATE)}
-                            )
+                            served = get_served()
+                            qa_chain = served["qa_chain"]
+                            semantic_cache = get_semantic_cache()
+                            memory = st.session_state.memory
+                            answer_placeholder = st.empty()
+
+                            # Follow-ups like "what about remote ones?" are looked up and retrieved by a standalone rewrite
+                            standalone_query = memory.standalone_query(prompt)
+                            trace_turn.set(standalone_query=standalone_query[:60])
+                            with tracing.span("faq_lookup") as faq_span:
+                                cached = get_faq_index().lookup(standalone_query, served["vectorstore"])
+                                faq_span.set(hit=cached is not None)
+                            query_vector = None
+                            if cached is None:
+                                with tracing.span("semantic_cache_lookup") as lookup_span:
+                                    cached, query_vector = semantic_cache.lookup(standalone_query)
+                                    lookup_span.set(hit=cached is not None)
+                            if cached is not None:
+                                result = cached["answer"]
+                                source_documents = cached["source_documents"]
+                                sources_html = format_sources(source_documents)
+                            elif STREAM_ANSWERS:
+                                # Show sources as soon as retrieval finishes, then stream tokens in
+                                with st.spinner("Asha is searching..."):
+                                    source_documents, tokens = stream_answer(qa_chain, standalone_query,
+                                                                             memory.prompt_question(prompt))
+                                sources_html = format_sources(source_documents)
+                                answer_placeholder.markdown(assistant_message_html(f"▌{sources_html}"), unsafe_allow_html=True)
 
-                            response = qa_chain.invoke({'query': prompt})
-                            result = response["result"]
-                            source_documents = response["source_documents"]
+                                result = ""
+                                last_render = 0.0
+                                render_s = 0.0
+                                # Screened token by token, so a harmful answer is cut off before it is shown
+                                screen = output_screen()
+                                with tracing.span("llm_stream") as llm_span:
+                                    for token in tokens:
+                                        if not result:
+                                            llm_span.set(first_token_ms=round((time.time() - turn_start) * 1000, 1))
+                                        if screen.feed(token):
+                                            break
+                                        result += token
+                                        if time.time() - last_render >= STREAM_RENDER_INTERVAL:
+                                            render_start = time.perf_counter()
+                                            answer_placeholder.markdown(assistant_message_html(f"{result}▌{sources_html}"), unsafe_allow_html=True)
+                                            render_s += time.perf_counter() - render_start
+                                            last_render = time.time()
+                                # Rendering happens between tokens, so it is part of llm_stream too
+                                tracing.record("render", render_s)
+                                if screen.match or screen.finish():
+                                    trace_turn.set(output_blocked=True)
+                                    result = OUTPUT_BLOCKED_MESSAGE
+                            else:
+                                with st.spinner("Asha is thinking..."), tracing.span("qa_chain_invoke"):
+                                    response = qa_chain.invoke({'query': standalone_query})
+                                result = response["result"]
+                                if screen_output(result):
+                                    trace_turn.set(output_blocked=True)
+                                    result = OUTPUT_BLOCKED_MESSAGE
+                                source_documents = response["source_documents"]
+                                sources_html = format_sources(source_documents)
+
+                            if cached is None and result.strip() and result != OUTPUT_BLOCKED_MESSAGE:
+                                semantic_cache.store(standalone_query, result, source_documents, vector=query_vector)
 
                             # Handle empty result fallback
                             if not result.strip():
                                 result = "I'm sorry, I couldn't find detailed job listings right now. You can explore [HerKey Jobs](https://www.herkey.com/jobs) directly!"
 
-                            # Format sources
-                            sources_text = ""
-                            unique_sources = set()
-                            for doc in source_documents:
-                                source = doc.metadata.get('source', 'Unknown')
-                                if source not in unique_sources:
-                                    unique_sources.add(source)
-                                    sources_text += f"- {source}\n"
-
-                            if sources_text:
-                                result_with_sources = f"{result}\n\n<div class='sources'><strong>Sources:</strong><br/>{'<br/>'.join(unique_sources)}</div>"
-                            else:
-                                result_with_sources = result
-
-                            st.markdown(f"""
-                            <div class="assistant-message">
-                                <strong>Asha:</strong> {result_with_sources}
-                            </div>
-                            """, unsafe_allow_html=True)
+                            result_with_sources = f"{result}{sources_html}"
+                            answer_placeholder.markdown(assistant_message_html(result_with_sources), unsafe_allow_html=True)
 
                             st.session_state.messages.append({'role': 'assistant', 'content': result_with_sources})
-                            st.session_state.history.append({"user": prompt, "assistant": result})
-
-                            analytics["questions"] += 1
-
-                            # Feedback section
-                            st.markdown("<div style='text-align: center; margin-top: 20px; color: #D0D0D0;'>Was this response helpful?</div>", unsafe_allow_html=True)
-                            
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                if st.button("👍 Yes", key="positive_feedback", help="Mark this response as helpful"):
-                                    analytics["feedback_positive"] += 1
-                                    st.success("Thank you for your feedback!")
-                            with col2:
-                                if st.button("👎 No", key="negative_feedback", help="Mark this response as not helpful"):
-                                    analytics["feedback_negative"] += 1
-                                    st.error("Thanks! We'll work to improve it.")
+                            memory.update(prompt, standalone_query, result)
+
+                            analytics_store.record_question(
+                                session_id, prompt,
+                                latency_ms=(time.time() - turn_start) * 1000,
+                                sources=list(dict.fromkeys(doc.metadata.get('source', 'Unknown') for doc in source_documents)),
+                                standalone=standalone_query,
+                            )
+                            st.session_state.last_turn = {"query": prompt, "rated": False}
 
                         except Exception as e:
+                            trace_turn.set(error=type(e).__name__)
                             st.error(f"Error: {str(e)}")
                             error_message = "I'm having trouble connecting to my knowledge base right now. Please try again in a moment."
                             st.markdown(f"""
@@ -232,13 +334,28 @@ def main():
                             </div>
                             """, unsafe_allow_html=True)
                             st.session_state.messages.append({'role': 'assistant', 'content': error_message})
+
+            # Feedback section, rendered on every rerun so the button click is seen
+            last_turn = st.session_state.get('last_turn')
+            if last_turn and not last_turn["rated"]:
+                st.markdown("<div style='text-align: center; margin-top: 20px; color: #D0D0D0;'>Was this response helpful?</div>", unsafe_allow_html=True)
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("👍 Yes", key="positive_feedback", help="Mark this response as helpful"):
+                        analytics_store.record_feedback(session_id, last_turn["query"], positive=True)
+                        last_turn["rated"] = True
+                        st.success("Thank you for your feedback!")
+                with col2:
+                    if st.button("👎 No", key="negative_feedback", help="Mark this response as not helpful"):
+                        analytics_store.record_feedback(session_id, last_turn["query"], positive=False)
+                        last_turn["rated"] = True
+                        st.error("Thanks! We'll work to improve it.")
         
         st.markdown("</div>", unsafe_allow_html=True)
         
         # Footer
         st.markdown(styles.FOOTER_HTML, unsafe_allow_html=True)
-    
-    save_analytics(analytics)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
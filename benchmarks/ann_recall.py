@@ -0,0 +1,187 @@
+"""Recall@k versus latency of the approximate index types against the exact flat index.
+
+Run from the repository root:
+
+    python -m benchmarks.ann_recall --synthetic 200000 --output ann_report.json
+    python -m benchmarks.ann_recall --query-encoder int8
+
+Vectors come from the built vectorstore. --synthetic grows the corpus to the
+given size by jittering real vectors, to preview a full company/job crawl.
+"scan MB" is what a search reads: for sq8/binary only the codes, as their
+float vectors are only read for the rescored candidates. "file MB" is the
+written index, float vectors included, i.e. what it costs on disk. --query-encoder also embeds the
+benchmark queries with a quantized query encoder and reports its encode time
+and the recall of its vectors against full-precision query vectors.
+"""
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+
+from ann_index import (QUANTIZED_TYPES, build_ann_index, built_index_type, describe_index, estimate_memory_bytes,
+                       flat_vectors, is_flat, set_search_params)
+from embedding_service import QUERY_ENCODERS, QuantizedQueryEncoder, get_embedding_model
+from vector_storage import load_vectorstore
+
+DB_FAISS_PATH = "vectorstore/db_faiss"
+NPROBE_SWEEP = [1, 4, 8, 16, 32, 64]
+EF_SEARCH_SWEEP = [16, 32, 64, 128, 256]
+RESCORE_SWEEP = [1, 2, 4, 10, 20]
+
+
+def load_texts(db):
+    return [db.docstore.search(db.index_to_docstore_id[i]).page_content for i in range(db.index.ntotal)]
+
+
+def load_vectors(db_path):
+    embedding_model = get_embedding_model()
+    db = load_vectorstore(db_path, embedding_model)
+    if is_flat(db.index):
+        return flat_vectors(db.index)
+    return embedding_model.embed_vectors(load_texts(db))
+
+
+def jitter(vectors, n, rng, scale=0.25):
+    """Sample n vectors around the given ones"""
+    base = vectors[rng.integers(0, len(vectors), size=n)]
+    noise = rng.normal(0, scale * np.linalg.norm(vectors, axis=1).mean() / np.sqrt(vectors.shape[1]), base.shape)
+    return (base + noise).astype(np.float32)
+
+
+def measure(index, queries, truth, k):
+    latencies = []
+    hits = 0
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(ids[0]) & set(truth[i]))
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "latency_ms_mean": float(np.mean(latencies)),
+    }
+
+
+def run(vectors, queries, k, pq_m):
+    n, d = vectors.shape
+    exact = faiss.IndexFlatL2(d)
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    rows = [dict(index_type="flat", requested="flat", index=describe_index(exact), param=None, build_s=0.0,
+                 scan_mb=estimate_memory_bytes("flat", n, d) / 1e6,
+                 file_mb=len(faiss.serialize_index(exact)) / 1e6, **measure(exact, queries, truth, k))]
+    for requested, sweep, param in (("ivf_flat", NPROBE_SWEEP, "nprobe"), ("ivf_pq", NPROBE_SWEEP, "nprobe"),
+                                    ("hnsw", EF_SEARCH_SWEEP, "ef_search"), ("sq8", RESCORE_SWEEP, "rescore_factor"),
+                                    ("binary", RESCORE_SWEEP, "rescore_factor")):
+        start = time.perf_counter()
+        index = build_ann_index(vectors, requested, pq_m=pq_m)
+        build_s = time.perf_counter() - start
+        # Rows are labelled with what was built: ivf_pq falls back to ivf_flat, and IVF to flat, on small corpora
+        index_type = built_index_type(index)
+        file_mb = len(faiss.serialize_index(index)) / 1e6
+        scan_mb = estimate_memory_bytes(index_type, n, d) / 1e6 if index_type in QUANTIZED_TYPES else file_mb
+        if index_type == "flat":
+            sweep = [None]
+        for value in sweep:
+            if value is not None:
+                set_search_params(index, **{param: value})
+            rows.append(dict(index_type=index_type, requested=requested, index=describe_index(index),
+                             param=f"{param}={value}" if value is not None else None, build_s=build_s,
+                             scan_mb=scan_mb, file_mb=file_mb, **measure(index, queries, truth, k)))
+    return rows
+
+
+def time_encoder(encode, texts):
+    """Mean ms to embed one query at a time, as chat turns do, and the vectors"""
+    encode(texts[:2])  # warm up
+    start = time.perf_counter()
+    vectors = np.vstack([np.asarray(encode([text]), dtype=np.float32) for text in texts])
+    return (time.perf_counter() - start) * 1000 / len(texts), vectors
+
+
+def run_query_encoder(kind, db_path, queries, k):
+    """Encode time and recall@k of a quantized query encoder against full-precision query vectors.
+
+    Document vectors stay full precision, as in serving; truth is the exact
+    search with full-precision query vectors.
+    """
+    embedding_model = get_embedding_model()
+    db = load_vectorstore(db_path, embedding_model)
+    vectors = embedding_model.embed_vectors(load_texts(db))
+    full_ms, full = time_encoder(embedding_model.model.embed_documents, queries)
+    encoder = QuantizedQueryEncoder(kind, embedding_model, model_name=embedding_model.model_name)
+    quantized_ms, quantized = time_encoder(encoder.embed_documents, queries)
+
+    k = min(k, len(vectors))
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(full, k)
+    report = {
+        "encoder": kind,
+        "queries": len(queries),
+        "full_ms_per_query": full_ms,
+        "quantized_ms_per_query": quantized_ms,
+        "mean_cosine": float(np.mean(np.sum(full * quantized, axis=1) / (
+            np.linalg.norm(full, axis=1) * np.linalg.norm(quantized, axis=1)))),
+        "recall_at_k": {},
+    }
+    for index_type in ("flat",) + QUANTIZED_TYPES:
+        index = exact if index_type == "flat" else build_ann_index(vectors, index_type)
+        _, ids = index.search(quantized, k)
+        hits = sum(len(set(found) & set(expected)) for found, expected in zip(ids, truth))
+        report["recall_at_k"][built_index_type(index)] = hits / (len(queries) * k)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", default=DB_FAISS_PATH)
+    parser.add_argument("--synthetic", type=int, default=0, help="Grow the corpus to this many vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--pq-m", type=int, default=48)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--query-encoder", choices=[kind for kind in QUERY_ENCODERS if kind != "torch"],
+                        help="Also compare this quantized query encoder with the full-precision model")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = load_vectors(args.db_path)
+    if args.synthetic > len(vectors):
+        vectors = np.vstack([vectors, jitter(vectors, args.synthetic - len(vectors), rng)])
+    queries = jitter(vectors, args.queries, rng)
+
+    rows = run(vectors, queries, args.k, args.pq_m)
+    print(f"{len(vectors)} vectors, d={vectors.shape[1]}, {args.queries} queries, recall@{args.k}")
+    print(f"{'index':<18} {'param':<18} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'scan MB':>9} {'file MB':>9} "
+          f"{'scan B/vec':>10} {'build s':>8}")
+    for row in rows:
+        label = row["index_type"] if row["index_type"] == row["requested"] else f"{row['requested']}->{row['index_type']}"
+        print(f"{label:<18} {row['param'] or '-':<18} {row['recall_at_k']:7.3f} "
+              f"{row['latency_ms_p50']:8.3f} {row['latency_ms_p95']:8.3f} {row['scan_mb']:9.1f} "
+              f"{row['file_mb']:9.1f} {row['scan_mb'] * 1e6 / len(vectors):10.0f} {row['build_s']:8.1f}")
+
+    encoder_report = None
+    if args.query_encoder:
+        from benchmarks.rag_latency import QUERIES
+        encoder_report = run_query_encoder(args.query_encoder, args.db_path, QUERIES, args.k)
+        print(f"\nQuery encoder {args.query_encoder}: {encoder_report['quantized_ms_per_query']:.1f} ms/query "
+              f"(full precision {encoder_report['full_ms_per_query']:.1f}), mean cosine to full-precision vectors "
+              f"{encoder_report['mean_cosine']:.4f}")
+        for index_type, recall in encoder_report["recall_at_k"].items():
+            print(f"  recall@{args.k} on {index_type}: {recall:.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"n": len(vectors), "d": int(vectors.shape[1]), "k": args.k, "results": rows,
+                       "query_encoder": encoder_report}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Per-character cost of the bias filter as the phrase list grows.
+
+Run from the repository root:
+
+    python -m benchmarks.bias_filter_throughput --sizes 10,100,1000,5000
+
+Compares the compiled Aho-Corasick matcher (whole texts and token-by-token
+streaming) with the original lowercase-and-substring loop, on phrase lists
+padded with random phrases that never match. The matcher should stay flat
+while the substring loop grows with the list.
+"""
+import time
+import random
+import string
+import argparse
+
+from bias_filter import PhraseMatcher, load_phrases
+from benchmarks.rag_latency import QUERIES
+
+ANSWER = ("Let's explore some opportunities! HerKey lists engineering roles for women across Pune, Mumbai and "
+          "Bangalore, including remote and part-time positions. Returning professionals can apply to restart "
+          "programs, and mentorship circles help with interview preparation and career planning. ") * 4
+
+
+def random_phrases(count, seed=0):
+    rng = random.Random(seed)
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))) for _ in range(2000)]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(1, 3))) for _ in range(count)]
+
+
+def naive_detect(keywords, text):
+    """The original detect_bias"""
+    text = text.lower()
+    return any(keyword in text for keyword in keywords)
+
+
+def time_per_char(check, texts, repeat):
+    chars = sum(len(text) for text in texts) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            check(text)
+    return (time.perf_counter() - start) / chars * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="Comma-separated phrase list sizes")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    version, input_phrases, output_phrases = load_phrases()
+    texts = QUERIES + [ANSWER]
+    tokens = ANSWER.split(" ")
+    print(f"Phrase file v{version}; {sum(len(text) for text in texts)} characters per pass")
+    print(f"{'phrases':>8} {'states':>8} {'compile ms':>11} {'matcher ns/char':>16} {'stream ns/char':>15} "
+          f"{'substring ns/char':>18}")
+    for size in [int(value) for value in args.sizes.split(",") if value]:
+        phrases = input_phrases + output_phrases + random_phrases(max(0, size - len(input_phrases) - len(output_phrases)))
+        start = time.perf_counter()
+        matcher = PhraseMatcher(phrases)
+        compile_ms = (time.perf_counter() - start) * 1000
+        keywords = [phrase.lower() for phrase in phrases]
+
+        def stream(text):
+            scanner = matcher.scanner()
+            for token in tokens:
+                scanner.feed(token + " ")
+            scanner.finish()
+
+        matcher_ns = time_per_char(matcher.search, texts, args.repeat)
+        stream_ns = time_per_char(stream, [ANSWER], args.repeat)
+        naive_ns = time_per_char(lambda text: naive_detect(keywords, text), texts, args.repeat)
+        print(f"{len(phrases):8d} {len(matcher.goto):8d} {compile_ms:11.1f} {matcher_ns:16.1f} {stream_ns:15.1f} "
+              f"{naive_ns:18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Throughput of HTML extraction over the data/cache corpus.
+
+Run from the repository root:
+
+    python -m benchmarks.extraction_throughput --repeat 5
+
+Compares the original html.parser implementation with the lxml/precompiled
+path, single-process and over a process pool, and checks that every page
+produces the same text.
+"""
+import os
+import glob
+import json
+import time
+import hashlib
+import argparse
+from bs4 import BeautifulSoup
+
+from html_extraction import EXTRACT_PROCESSES, HTML_PARSER, create_extraction_pool, extract_text, precompile_selectors
+
+CACHE_DIR = "data/cache"
+URLS_FILE = "data/urls.json"
+
+
+def baseline_extract(html, content_selectors=None):
+    """The original WebContentScraper.extract_content"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    for element in soup.select('script, style, nav, footer, header, [class*="ads"], [id*="ads"]'):
+        element.decompose()
+
+    if content_selectors:
+        extracted_content = []
+        for selector in content_selectors:
+            elements = soup.select(selector)
+            for element in elements:
+                extracted_content.append(element.get_text(strip=True, separator=' '))
+        if extracted_content:
+            return ' '.join(extracted_content)
+
+    main_content = soup.select('main, article, .content, #content, .post, .article')
+    if main_content:
+        return ' '.join([el.get_text(strip=True, separator=' ') for el in main_content])
+
+    body = soup.find('body')
+    return body.get_text(strip=True, separator=' ') if body else ''
+
+
+def load_corpus(cache_dir, urls_file):
+    """(html, selectors) for every cached page; pages not in urls.json use the fallbacks"""
+    with open(urls_file, 'r') as f:
+        selectors_by_hash = {
+            hashlib.md5(url_info["url"].encode()).hexdigest(): url_info.get("selectors")
+            for url_info in json.load(f)
+        }
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(cache_dir, "*.html"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            html = f.read()
+        url_hash = os.path.basename(path).split('.', 1)[0]
+        corpus.append((html, selectors_by_hash.get(url_hash)))
+    return corpus
+
+
+def timed(label, run, corpus, repeat):
+    megabytes = sum(len(html.encode('utf-8')) for html, _ in corpus) / 1e6
+    start = time.perf_counter()
+    for _ in range(repeat):
+        outputs = run(corpus)
+    elapsed = time.perf_counter() - start
+    pages = len(corpus) * repeat
+    print(f"{label:<28} {pages / elapsed:9.1f} pages/s {megabytes * repeat / elapsed:8.2f} MB/s")
+    return outputs, {"pages_per_s": pages / elapsed, "mb_per_s": megabytes * repeat / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--processes", type=int, default=EXTRACT_PROCESSES)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(CACHE_DIR, URLS_FILE)
+    print(f"{len(corpus)} cached pages, parser={HTML_PARSER}, processes={args.processes}")
+    precompile_selectors(URLS_FILE)
+
+    results = {}
+    expected, results["baseline"] = timed(
+        "baseline (html.parser)", lambda pages: [baseline_extract(h, s) for h, s in pages], corpus, args.repeat)
+    fast, results["fast"] = timed(
+        f"fast ({HTML_PARSER}, 1 process)", lambda pages: [extract_text(h, s) for h, s in pages], corpus, args.repeat)
+    with create_extraction_pool(args.processes, URLS_FILE) as pool:
+        pooled, results["pool"] = timed(
+            f"fast ({args.processes} processes)",
+            lambda pages: list(pool.map(extract_text, [h for h, _ in pages], [s for _, s in pages])),
+            corpus, args.repeat)
+
+    mismatches = sum(1 for a, b, c in zip(expected, fast, pooled) if not a == b == c)
+    print(f"Output parity: {len(corpus) - mismatches}/{len(corpus)} pages identical")
+    results["mismatches"] = mismatches
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Latency of the question-answering path with a local stand-in for the LLM endpoint.
+
+Run from the repository root:
+
+    python -m benchmarks.rag_latency --repeat 3 --concurrency 1,4,16 --output rag_report.json
+
+Every query of a fixed set covering the data/urls.json topics goes through
+the same code as the chat app (retriever, prompt assembly, streamed answer).
+The HuggingFace endpoint is replaced by FakeEndpoint, which waits and emits
+tokens at a configurable rate, so no network or token is needed and the
+numbers isolate retrieval and prompt cost. The semantic answer cache is
+bypassed.
+
+"embed" is the model encoding a query, timed with the query LRU bypassed,
+so repeats and reruns measure the same work as a first-time question;
+end_to_end starts with it. "embed_cached" is the same query answered from
+the LRU, as the retriever then gets it.
+"""
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, List, Optional
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from ann_index import describe_index
+from connect_memory_with_llm import DB_FAISS_PATH, build_prompt, build_qa_chain
+from context_packing import CONTEXT_TOKEN_BUDGET, count_tokens
+from embedding_service import get_query_embedder
+from vector_storage import load_vectorstore
+
+QUERIES = [
+    "What is HerKey and how does it help women with their careers?",
+    "Show me the latest jobs on HerKey",
+    "Are there engineering jobs for women?",
+    "Which software engineer roles are open right now?",
+    "Can I find remote engineering jobs?",
+    "I want to work from home as a developer",
+    "What opportunities does JSW offer for women?",
+    "Tell me about jobs at Axim Technologies",
+    "Does Inquizity hire for supply chain roles?",
+    "Engineering jobs in Pune",
+    "Are there jobs in Mumbai or Navi Mumbai?",
+    "Find me jobs in Bangalore",
+    "Jobs in Hyderabad or Secunderabad for women",
+    "I am a fresher, which entry-level engineering jobs can I apply for?",
+    "What roles suit a recent graduate returning to work?",
+    "Are there part-time engineering jobs for women?",
+    "I need a flexible job while caring for my family",
+    "Hi Asha!",
+    "How do I restart my career after a break?",
+    "Are there mentorship programs for women in tech?",
+]
+STAGES = ["embed", "embed_cached", "search", "retrieve", "prompt", "first_token", "end_to_end"]
+
+
+class FakeEndpoint(LLM):
+    """Stands in for HuggingFaceEndpoint: waits like a remote model, then emits tokens at a fixed rate"""
+    latency_s: float = 0.3
+    tokens_per_s: float = 50.0
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-huggingface-endpoint"
+
+    def _tokens(self, prompt):
+        words = prompt.split() or ["..."]
+        return [f"{words[i % len(words)]} " for i in range(self.answer_tokens)]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        time.sleep(self.latency_s + self.answer_tokens / self.tokens_per_s)
+        return "".join(self._tokens(prompt))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        time.sleep(self.latency_s)
+        for token in self._tokens(prompt):
+            time.sleep(1 / self.tokens_per_s)
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic random-projection embeddings for machines without the sentence-transformers model"""
+    def __init__(self, dim):
+        self.dim = dim
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha1(text.encode('utf-8')).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def summarize(samples):
+    """Percentiles in milliseconds"""
+    values = np.array(samples) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
+
+
+def answer(qa_chain, vectorstore, query, k):
+    """Run one query through every stage, returning the stage timings in seconds"""
+    timings = {}
+    embeddings = vectorstore.embeddings
+    start = time.perf_counter()
+    # The model itself; embed_query would be an LRU hit for every repeat of the query set
+    vector = getattr(embeddings, "embed_uncached", embeddings.embed_query)(query)
+    timings["embed"] = time.perf_counter() - start
+
+    cached_start = time.perf_counter()
+    embeddings.embed_query(query)
+    timings["embed_cached"] = time.perf_counter() - cached_start
+
+    search_start = time.perf_counter()
+    vectorstore.similarity_search_by_vector(vector, k=k)
+    timings["search"] = time.perf_counter() - search_start
+
+    # From here on the same calls as stream_answer, timed one by one
+    retrieve_start = time.perf_counter()
+    source_documents = qa_chain.retriever.invoke(query)
+    timings["retrieve"] = time.perf_counter() - retrieve_start
+
+    prompt_start = time.perf_counter()
+    prompt_text = build_prompt(qa_chain, query, source_documents)
+    timings["prompt"] = time.perf_counter() - prompt_start
+
+    llm_start = time.perf_counter()
+    for i, _ in enumerate(qa_chain.combine_documents_chain.llm_chain.llm.stream(prompt_text)):
+        if i == 0:
+            timings["first_token"] = time.perf_counter() - start
+    timings["end_to_end"] = time.perf_counter() - start
+    timings["llm"] = time.perf_counter() - llm_start
+    return timings
+
+
+def run_sequential(qa_chain, vectorstore, queries, k, repeat):
+    samples = {stage: [] for stage in STAGES + ["llm"]}
+    for _ in range(repeat):
+        for query in queries:
+            for stage, seconds in answer(qa_chain, vectorstore, query, k).items():
+                samples[stage].append(seconds)
+    return {stage: summarize(values) for stage, values in samples.items() if values}
+
+
+def run_concurrent(qa_chain, vectorstore, queries, k, sessions):
+    """Every session asks the whole query set; returns throughput and end-to-end latency"""
+    def session(offset):
+        # Sessions start at different queries so they do not move in lockstep
+        ordered = queries[offset % len(queries):] + queries[:offset % len(queries)]
+        return [answer(qa_chain, vectorstore, query, k)["end_to_end"] for query in ordered]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        latencies = [seconds for result in pool.map(session, range(sessions)) for seconds in result]
+    elapsed = time.perf_counter() - start
+    return {"sessions": sessions, "queries": len(latencies), "elapsed_s": elapsed,
+            "queries_per_s": len(latencies) / elapsed, "end_to_end": summarize(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", default=DB_FAISS_PATH)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the query set for the per-stage numbers")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrent session counts")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Fake endpoint seconds before the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=50.0, help="Fake endpoint generation rate")
+    parser.add_argument("--answer-tokens", type=int, default=60, help="Fake endpoint tokens per answer")
+    parser.add_argument("--context-budget", type=int, default=CONTEXT_TOKEN_BUDGET,
+                        help="Prompt context token budget; 0 stuffs the top k chunks unpacked")
+    parser.add_argument("--rerank", action="store_true",
+                        help="Over-fetch and rerank with the cross-encoder (see reranker.RERANK_MODEL_NAME)")
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="Embed queries with random projections instead of loading the embedding model")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    query_embedder = get_query_embedder()
+    vectorstore = load_vectorstore(args.db_path, query_embedder)
+    if args.fake_embeddings:
+        vectorstore.embedding_function = HashEmbeddings(vectorstore.index.d)
+    llm = FakeEndpoint(latency_s=args.llm_latency, tokens_per_s=args.tokens_per_s, answer_tokens=args.answer_tokens)
+    qa_chain = build_qa_chain(llm, vectorstore, k=args.k, db_path=args.db_path,
+                              context_token_budget=args.context_budget or None, rerank=args.rerank)
+
+    # Warm up lazy loading (model weights, memory-mapped pages, BM25 postings)
+    answer(qa_chain, vectorstore, QUERIES[0], args.k)
+
+    print(f"{vectorstore.index.ntotal} vectors ({describe_index(vectorstore.index)}), {len(QUERIES)} queries, "
+          f"retriever {type(qa_chain.retriever).__name__}, fake LLM {args.llm_latency}s + "
+          f"{args.answer_tokens} tokens at {args.tokens_per_s}/s")
+    prompt_tokens = [count_tokens(build_prompt(qa_chain, query, qa_chain.retriever.invoke(query))) for query in QUERIES]
+    print(f"Prompt tokens: mean {np.mean(prompt_tokens):.0f}, max {max(prompt_tokens)}")
+    stages = run_sequential(qa_chain, vectorstore, QUERIES, args.k, args.repeat)
+    print(f"{'stage':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for stage, row in stages.items():
+        print(f"{stage:<12} {row['p50_ms']:9.2f} {row['p95_ms']:9.2f} {row['p99_ms']:9.2f} {row['mean_ms']:9.2f}")
+
+    concurrency = []
+    print(f"{'sessions':>8} {'queries':>8} {'q/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for sessions in [int(value) for value in args.concurrency.split(",") if value]:
+        row = run_concurrent(qa_chain, vectorstore, QUERIES, args.k, sessions)
+        concurrency.append(row)
+        latency = row["end_to_end"]
+        print(f"{sessions:8d} {row['queries']:8d} {row['queries_per_s']:8.2f} {latency['p50_ms']:9.1f} "
+              f"{latency['p95_ms']:9.1f} {latency['p99_ms']:9.1f}")
+
+    if args.output:
+        report = {
+            "created_at": time.time(),
+            "index": {"ntotal": int(vectorstore.index.ntotal), "type": describe_index(vectorstore.index)},
+            "retriever": type(qa_chain.retriever).__name__,
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "queries": QUERIES,
+            "prompt_tokens": {"mean": float(np.mean(prompt_tokens)), "max": max(prompt_tokens)},
+            "stages": stages,
+            "concurrency": concurrency,
+            "query_embeddings": {"lru_hits": query_embedder.lru_hits, "lru_misses": query_embedder.lru_misses,
+                                 "model_batches": query_embedder.batches},
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
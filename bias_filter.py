@@ -0,0 +1,200 @@
+import json
+import threading
+import unicodedata
+from collections import deque
+
+# Constants
+BIAS_PHRASES_FILE = "data/bias_phrases.json"
+# Used when the phrase file is missing
+BIAS_KEYWORDS = ["bad women", "inferior", "weak", "should not work", "can't work", "unsuitable for women"]
+OUTPUT_BLOCKED_MESSAGE = ("I'm sorry, I can't share that answer. Asha is here to support every woman's career - "
+                          "try asking about jobs, mentorship or skills on [HerKey](https://www.herkey.com/jobs)!")
+
+JOINERS = frozenset("'’`*._-")  # dropped inside words, so "w.e.a.k" and "in*ferior" still match
+CONFUSABLES = {
+    "а": "a", "е": "e", "о": "o", "р": "p", "с": "c", "х": "x", "у": "y", "і": "i", "ѕ": "s", "ј": "j", "ԁ": "d",
+    "α": "a", "ε": "e", "ι": "i", "ο": "o", "ν": "v", "τ": "t", "κ": "k",
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s",
+}
+
+_char_map = {}
+
+
+def normalize_char(ch):
+    """What one (already NFKD-decomposed, casefolded) character contributes to the matched text.
+
+    Letters and digits map to themselves or their look-alike, combining marks,
+    zero-width characters and joiners vanish, everything else separates words.
+    """
+    mapped = _char_map.get(ch)
+    if mapped is None:
+        category = unicodedata.category(ch)
+        if ch in CONFUSABLES:
+            mapped = CONFUSABLES[ch]
+        elif ch.isalnum():
+            mapped = ch
+        elif ch in JOINERS or category.startswith("M") or category == "Cf":
+            mapped = ""
+        else:
+            mapped = " "
+        _char_map[ch] = mapped
+    return mapped
+
+
+def prepare(text):
+    """Unicode compatibility decomposition and case folding, both done by C code on the whole text"""
+    return unicodedata.normalize("NFKD", text).casefold()
+
+
+def normalize(text):
+    """Normalized form of a whole text: the character stream the matcher sees"""
+    out = []
+    for ch in prepare(text):
+        mapped = normalize_char(ch)
+        if mapped == " " and (not out or out[-1] == " "):
+            continue
+        out.append(mapped)
+    return "".join(out).strip()
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over normalized phrases.
+
+    Every input character costs one transition (plus amortised failure links),
+    however many phrases there are. Phrases are padded with spaces so they
+    only match whole words: "weak" no longer fires on "tweak".
+    """
+    def __init__(self, phrases):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [None]
+        self.phrases = 0
+        for phrase in phrases:
+            key = normalize(phrase)
+            if key:
+                self._add(f" {key} ", phrase)
+                self.phrases += 1
+        self._link()
+
+    def _add(self, key, phrase):
+        state = 0
+        for ch in key:
+            following = self.goto[state].get(ch)
+            if following is None:
+                following = self.goto[state][ch] = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(None)
+            state = following
+        self.out[state] = phrase
+
+    def _link(self):
+        """Breadth-first failure links; out[] inherits matches that end at the failure state"""
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, following in self.goto[state].items():
+                pending.append(following)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = self.goto[fallback].get(ch, 0)
+                if self.out[following] is None:
+                    self.out[following] = self.out[self.fail[following]]
+
+    def scanner(self):
+        return Scanner(self)
+
+    def search(self, text):
+        """First phrase found in text, or None"""
+        scanner = Scanner(self)
+        return scanner.feed(text) or scanner.finish()
+
+
+class Scanner:
+    """Incremental match state, so streamed text is screened once as it arrives.
+
+    A phrase split across tokens is still found, and earlier tokens are never
+    rescanned.
+    """
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.state = 0
+        self.after_space = False
+        self.match = None
+        self._step(" ")
+
+    def _step(self, ch):
+        goto, fail = self.matcher.goto, self.matcher.fail
+        state = self.state
+        while state and ch not in goto[state]:
+            state = fail[state]
+        self.state = goto[state].get(ch, 0)
+        return self.matcher.out[self.state]
+
+    def feed(self, text):
+        """Scan more text; returns the matched phrase once one is found"""
+        if self.match is not None:
+            return self.match
+        for ch in prepare(text):
+            mapped = normalize_char(ch)
+            if not mapped:
+                continue
+            if mapped == " ":
+                if self.after_space:
+                    continue
+                self.after_space = True
+            else:
+                self.after_space = False
+            for c in mapped:
+                phrase = self._step(c)
+                if phrase is not None:
+                    self.match = phrase
+                    return phrase
+        return None
+
+    def finish(self):
+        """End of text: a phrase ending on the last word matches now"""
+        return self.feed(" ")
+
+
+def load_phrases(path=BIAS_PHRASES_FILE):
+    """(version, input phrases, output phrases) from the phrase file, or the built-in list"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"Could not read {path} ({type(e).__name__}); using the built-in bias keywords")
+        return 0, BIAS_KEYWORDS, []
+    return data.get("version", 0), data.get("input", []), data.get("output", [])
+
+
+_matchers = None
+_matchers_lock = threading.Lock()
+
+
+def get_matchers():
+    """Input and output matchers, compiled once per process"""
+    global _matchers
+    if _matchers is None:
+        with _matchers_lock:
+            if _matchers is None:
+                version, input_phrases, output_phrases = load_phrases()
+                _matchers = {"version": version, "input": PhraseMatcher(input_phrases),
+                             "output": PhraseMatcher(output_phrases)}
+                print(f"Loaded bias phrases v{version}: {len(input_phrases)} input, {len(output_phrases)} output")
+    return _matchers
+
+
+def detect_bias(prompt):
+    return get_matchers()["input"].search(prompt) is not None
+
+
+def output_screen():
+    """Scanner for an answer as it streams; feed() each token, finish() at the end"""
+    return get_matchers()["output"].scanner()
+
+
+def screen_output(answer):
+    """Whether a complete answer must be withheld"""
+    return get_matchers()["output"].search(answer) is not None
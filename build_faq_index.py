@@ -0,0 +1,109 @@
+import time
+import argparse
+from analytics_store import ANALYTICS_DB, LEGACY_ANALYTICS_FILE, AnalyticsStore
+from bias_filter import detect_bias, screen_output
+from connect_memory_with_llm import APP_PROMPT_TEMPLATE, CUSTOM_PROMPT_TEMPLATE, get_qa_chain, get_vectorstore
+from faq_index import (FAQ_INDEX_FILE, FaqIndex, entry_key, faq_key, load_faq_entries, prompt_id, source_chunk_ids,
+                       write_faq_index)
+
+# Constants
+FAQ_TOP_QUERIES = 50
+FAQ_MIN_COUNT = 3  # times a query must have been asked to get a precomputed answer
+FAQ_LOOKBACK_DAYS = 30
+# Answers are generated once per prompt template they are served with
+PROMPTS = {
+    "app": APP_PROMPT_TEMPLATE,  # Streamlit app (asha_bot.py)
+    "api": CUSTOM_PROMPT_TEMPLATE,  # serve_api.py and the command line
+}
+
+
+def top_queries(analytics, top=FAQ_TOP_QUERIES, min_count=FAQ_MIN_COUNT, days=FAQ_LOOKBACK_DAYS):
+    """[(key, query, count)] of the most asked queries, near-exact repeats counted together.
+
+    The most common wording of each key is the query that gets answered.
+    """
+    since = time.time() - days * 24 * 3600 if days else None
+    groups = {}
+    for query, count in analytics.question_counts(since):
+        key = faq_key(query)
+        if not key:
+            continue
+        group = groups.setdefault(key, {"query": query, "count": 0})
+        # question_counts is sorted by count, so the first wording seen is the most common
+        group["count"] += count
+    ranked = sorted(groups.items(), key=lambda item: -item[1]["count"])
+    return [(key, group["query"], group["count"]) for key, group in ranked
+            if group["count"] >= min_count][:top]
+
+
+def answer_queries(queries, prompt_template, vectorstore, path=FAQ_INDEX_FILE, force=False):
+    """FAQ index entries for the queries, answered through the RAG chain with the given prompt template.
+
+    Answers whose source chunks are unchanged in the current index are kept
+    as they are unless force is set, so a rerun only calls the LLM for new
+    or stale entries.
+    """
+    existing = FaqIndex(prompt_template, path)
+    current = existing.current(vectorstore)
+    qa_chain = None
+    entries = {}
+    reused = answered = skipped = 0
+    for key, query, count in queries:
+        file_key = entry_key(existing.prompt_id, key)
+        if key in current and not force:
+            entries[file_key] = dict(existing.entries[file_key], count=count)
+            reused += 1
+            continue
+        if detect_bias(query):
+            skipped += 1
+            continue
+        qa_chain = qa_chain or get_qa_chain(custom_prompt_template=prompt_template)
+        start = time.time()
+        response = qa_chain.invoke({'query': query})
+        answer = response["result"].strip()
+        chunk_ids = source_chunk_ids(response["source_documents"])
+        if not answer or not chunk_ids or screen_output(answer):
+            print(f"Skipping {query!r}: no usable answer")
+            skipped += 1
+            continue
+        entries[file_key] = {"key": key, "prompt_id": existing.prompt_id, "query": query, "answer": answer,
+                             "chunk_ids": chunk_ids, "count": count, "answered_at": time.time()}
+        answered += 1
+        print(f"Answered {query!r} ({count} asks) in {time.time() - start:.1f}s")
+    print(f"{answered} answered, {reused} reused, {skipped} skipped")
+    return entries
+
+
+def main(top=FAQ_TOP_QUERIES, min_count=FAQ_MIN_COUNT, days=FAQ_LOOKBACK_DAYS, force=False, path=FAQ_INDEX_FILE,
+         prompts=tuple(PROMPTS)):
+    """Answer the most frequent queries with each of the given PROMPTS and write the FAQ index"""
+    analytics = AnalyticsStore(ANALYTICS_DB, legacy_file=LEGACY_ANALYTICS_FILE)
+    queries = top_queries(analytics, top, min_count, days)
+    print(f"{len(queries)} queries asked at least {min_count} times in the last {days} days")
+    if not queries:
+        return None
+
+    vectorstore = get_vectorstore()
+    # Answers for the prompts not being rebuilt stay as they are
+    rebuilt = {prompt_id(PROMPTS[name]) for name in prompts}
+    entries = {file_key: entry for file_key, entry in load_faq_entries(path).items() if entry["prompt_id"] not in rebuilt}
+    for name in prompts:
+        print(f"Answering with the {name} prompt")
+        entries.update(answer_queries(queries, PROMPTS[name], vectorstore, path, force))
+
+    write_faq_index(entries, path)
+    print(f"Wrote {len(entries)} FAQ answers to {path}")
+    return entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute answers to the most frequent queries")
+    parser.add_argument("--top", type=int, default=FAQ_TOP_QUERIES, help="Most asked queries to answer")
+    parser.add_argument("--min-count", type=int, default=FAQ_MIN_COUNT, help="Times a query must have been asked")
+    parser.add_argument("--days", type=int, default=FAQ_LOOKBACK_DAYS, help="Analytics window; 0 for all time")
+    parser.add_argument("--force", action="store_true", help="Re-answer entries whose sources are unchanged")
+    parser.add_argument("--prompt", choices=list(PROMPTS), action="append",
+                        help="Only answer with this prompt template (repeatable); default: all of them")
+    args = parser.parse_args()
+    main(top=args.top, min_count=args.min_count, days=args.days, force=args.force,
+         prompts=args.prompt or tuple(PROMPTS))
@@ -1,17 +1,74 @@
 import os
+import functools
 from langchain_huggingface import HuggingFaceEndpoint
-from langchain_core.prompts import PromptTemplate
+from langchain_core.prompts import PromptTemplate, format_document
 from langchain.chains import RetrievalQA
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from semantic_cache import SemanticCache
+from faq_index import FaqIndex
+from conversation_memory import ConversationMemory
+from bias_filter import OUTPUT_BLOCKED_MESSAGE, output_screen, screen_output
+from context_packing import CANDIDATES_PER_RESULT, CONTEXT_TOKEN_BUDGET, PackedRetriever
+from reranker import RERANK_ENABLED, RERANK_FETCH_K, RerankRetriever, get_reranker
+from embedding_service import get_query_embedder
+from hybrid_retrieval import build_retriever
+from vector_storage import load_vectorstore
+import tracing
 
 # Constants
 DB_FAISS_PATH = "vectorstore/db_faiss"
 HF_TOKEN = os.environ.get("HF_TOKEN")
 HUGGINGFACE_REPO_ID = "mistralai/Mistral-7B-Instruct-v0.3"
+HTTP_POOL_SIZE = 32
+ASYNC_HTTP_POOL_SIZE = 8  # concurrent ainvoke/astream calls; serve_api passes its MAX_CONCURRENT_LLM_CALLS
+
+_http_pool_configured = False
+
+def configure_http_pool(pool_size=HTTP_POOL_SIZE, async_pool_size=ASYNC_HTTP_POOL_SIZE):
+    """Make inference calls reuse keep-alive connections, sync and async alike; the first call wins"""
+    global _http_pool_configured
+    if _http_pool_configured:
+        return
+    import huggingface_hub
+
+    if hasattr(huggingface_hub, "configure_http_backend"):
+        # huggingface_hub < 1.0 talks to the endpoint through requests sessions
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        def backend_factory():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            return session
+
+        huggingface_hub.configure_http_backend(backend_factory=backend_factory)
+    elif hasattr(huggingface_hub, "set_client_factory"):
+        # huggingface_hub >= 1.0 already shares one pooled httpx client for sync calls; keep httpx's
+        # 100-connection cap but keep more of them alive than its default 20. ainvoke/astream go through
+        # an AsyncInferenceClient with its own httpx.AsyncClient, sized to the LLM calls served at once.
+        import httpx
+        from huggingface_hub.utils import _http
+
+        def client_factory():
+            limits = httpx.Limits(max_connections=max(100, pool_size), max_keepalive_connections=pool_size)
+            return httpx.Client(limits=limits, event_hooks={"request": [_http.hf_request_event_hook]},
+                                follow_redirects=True, timeout=None)
+
+        def async_client_factory():
+            limits = httpx.Limits(max_connections=async_pool_size, max_keepalive_connections=async_pool_size)
+            return httpx.AsyncClient(limits=limits, event_hooks={
+                "request": [_http.async_hf_request_event_hook],
+                "response": [_http.async_hf_response_event_hook],
+            }, follow_redirects=True, timeout=None)
+
+        huggingface_hub.set_client_factory(client_factory)
+        huggingface_hub.set_async_client_factory(async_client_factory)
+    _http_pool_configured = True
 
 def load_llm(huggingface_repo_id):
     """Load HuggingFace LLM endpoint"""
+    configure_http_pool()
     llm = HuggingFaceEndpoint(
         repo_id=huggingface_repo_id,
         temperature=0.5,
@@ -26,12 +83,7 @@ def set_custom_prompt(custom_prompt_template):
     prompt = PromptTemplate(template=custom_prompt_template, input_variables=["context", "question"])
     return prompt
 
-def connect_memory():
-    """Connect to FAISS vectorstore and prepare Retrieval QA chain"""
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    db = FAISS.load_local(DB_FAISS_PATH, embedding_model, allow_dangerous_deserialization=True)
-
-    CUSTOM_PROMPT_TEMPLATE = """
+CUSTOM_PROMPT_TEMPLATE = """
   You are Asha, an AI chatbot focused on women empowerment and career development.
 Your goal: Help women navigate careers, find job opportunities, and access growth resources.
 
@@ -61,24 +113,160 @@ Start answers directly. Be encouraging and empowering.
    
     """
 
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=load_llm(HUGGINGFACE_REPO_ID),
+# Persona of the Streamlit app (asha_bot.py); kept here so build_faq_index.py can answer with it too
+APP_PROMPT_TEMPLATE = """
+                            You are Asha, an AI chatbot focused on women empowerment and career development.
+                            Always start your answer with a short encouraging line like "Let's explore some opportunities!" or "Here's what I found to help you!"
+
+                            Use the context provided to suggest specific job roles, mentorship programs, or events related to women's careers.
+                            If detailed information is missing, politely guide the user to visit https://www.herkey.com/jobs for updated listings.
+
+                            Context: {context}
+                            Question: {question}
+
+                            Keep your tone supportive, encouraging, and career-focused. 
+                            Never invent fake job titles if not found.
+                            """
+
+@functools.lru_cache(maxsize=None)
+def get_vectorstore():
+    """Load the FAISS vectorstore once per process"""
+    with tracing.span("load_vectorstore"):
+        return load_vectorstore(DB_FAISS_PATH, get_query_embedder())
+
+def build_qa_chain(llm, vectorstore, k=5, custom_prompt_template=CUSTOM_PROMPT_TEMPLATE, db_path=DB_FAISS_PATH,
+                   context_token_budget=CONTEXT_TOKEN_BUDGET, rerank=RERANK_ENABLED):
+    """Retrieval QA chain over the given LLM and vectorstore.
+
+    With rerank, RERANK_FETCH_K chunks are retrieved and a cross-encoder keeps
+    the best k. Otherwise, with a context_token_budget, k * CANDIDATES_PER_RESULT
+    chunks are retrieved. Either way the chunks are then packed into the
+    budget (duplicates dropped, neighbours merged); with no budget they are
+    stuffed into the prompt as they are.
+    """
+    if rerank:
+        retriever = RerankRetriever(retriever=build_retriever(vectorstore, RERANK_FETCH_K, db_path),
+                                    reranker=get_reranker(), top_n=k)
+    else:
+        retriever = build_retriever(vectorstore, k * CANDIDATES_PER_RESULT if context_token_budget else k, db_path)
+    if context_token_budget:
+        retriever = PackedRetriever(retriever=retriever, token_budget=context_token_budget)
+    return RetrievalQA.from_chain_type(
+        llm=llm,
         chain_type="stuff",
-        retriever=db.as_retriever(search_kwargs={'k': 5}),
+        retriever=retriever,
         return_source_documents=True,
-        chain_type_kwargs={'prompt': set_custom_prompt(CUSTOM_PROMPT_TEMPLATE)}
+        chain_type_kwargs={'prompt': set_custom_prompt(custom_prompt_template)}
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_qa_chain(huggingface_repo_id=HUGGINGFACE_REPO_ID, k=5, custom_prompt_template=CUSTOM_PROMPT_TEMPLATE):
+    """Build the Retrieval QA chain once per process for each configuration"""
+    return build_qa_chain(load_llm(huggingface_repo_id), get_vectorstore(), k, custom_prompt_template)
+
+@functools.lru_cache(maxsize=None)
+def get_semantic_cache():
+    """Semantic answer cache in front of the QA chain, sharing the vectorstore's embedder"""
+    return SemanticCache(get_vectorstore().embeddings, db_path=DB_FAISS_PATH)
+
+@functools.lru_cache(maxsize=None)
+def get_faq_index():
+    """Precomputed answers to the most frequent queries (see build_faq_index.py), as get_qa_chain() words them"""
+    return FaqIndex(CUSTOM_PROMPT_TEMPLATE)
+
+def build_prompt(qa_chain, query, source_documents):
+    """The exact prompt the chain's "stuff" step sends to the LLM"""
+    stuff_chain = qa_chain.combine_documents_chain
+    context = stuff_chain.document_separator.join(
+        format_document(doc, stuff_chain.document_prompt) for doc in source_documents
     )
+    return stuff_chain.llm_chain.prompt.format(**{
+        stuff_chain.document_variable_name: context,
+        "question": query,
+    })
+
+def stream_answer(qa_chain, query, question=None):
+    """Retrieve sources for the query, then stream the answer from the chain's LLM.
 
-    return qa_chain
+    Retrieval runs before this returns, so callers can show the sources right
+    away. question, if given, replaces the query in the prompt (e.g. the
+    user's words plus the conversation summary). Returns
+    (source_documents, token_iterator).
+    """
+    with tracing.span("retrieve"):
+        source_documents = qa_chain.retriever.invoke(query)
+    with tracing.span("build_prompt"):
+        prompt_text = build_prompt(qa_chain, question or query, source_documents)
+    return source_documents, qa_chain.combine_documents_chain.llm_chain.llm.stream(prompt_text)
+
+def connect_memory():
+    """Connect to FAISS vectorstore and prepare Retrieval QA chain"""
+    return get_qa_chain()
 
 # For testing
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Ask Asha a question from the command line")
+    parser.add_argument("--no-stream", action="store_true", help="Wait for the full answer instead of streaming it")
+    args = parser.parse_args()
+
     qa_chain = connect_memory()
-    user_query = input("Ask Asha about women's career development: ")
-    response = qa_chain.invoke({'query': user_query})
-
-    print("\nASHA SAYS:", response["result"])
-    print("\nSOURCE DOCUMENTS:")
-    for i, doc in enumerate(response["source_documents"]):
-        print(f"\nSource {i+1}: {doc.metadata.get('source', 'Unknown')}")
-        print(f"Content snippet: {doc.page_content[:150]}...")
+    semantic_cache = get_semantic_cache()
+    faq_index = get_faq_index()
+    memory = ConversationMemory()
+
+    while True:
+        user_query = input("\nAsk Asha about women's career development (empty line to quit): ").strip()
+        if not user_query:
+            break
+
+        # Follow-ups are looked up and retrieved by their standalone rewrite
+        standalone_query = memory.standalone_query(user_query)
+        cached = faq_index.lookup(standalone_query, get_vectorstore())
+        if cached is not None:
+            hit = "FAQ"
+        else:
+            cached, query_vector = semantic_cache.lookup(standalone_query)
+            hit = f"cached, similarity {cached['similarity']:.2f}" if cached is not None else None
+        if cached is not None:
+            source_documents = cached["source_documents"]
+            answer = cached["answer"]
+            print(f"\nASHA SAYS ({hit}):", answer)
+        elif args.no_stream:
+            response = qa_chain.invoke({'query': standalone_query})
+            source_documents = response["source_documents"]
+            answer = response["result"]
+            blocked = screen_output(answer)
+            if blocked:
+                answer = OUTPUT_BLOCKED_MESSAGE
+            print("\nASHA SAYS:", answer)
+            if not blocked:
+                semantic_cache.store(standalone_query, answer, source_documents, vector=query_vector)
+        else:
+            source_documents, tokens = stream_answer(qa_chain, standalone_query, memory.prompt_question(user_query))
+            # Screened token by token; a phrase only matches once the word after it starts, so the
+            # unfinished last word is held back and a match stops generation before it is printed
+            screen = output_screen()
+            print("\nASHA SAYS: ", end="", flush=True)
+            answer = held = ""
+            for token in tokens:
+                if screen.feed(token):
+                    break
+                answer += token
+                held += token
+                cut = max(held.rfind(" "), held.rfind("\n")) + 1
+                print(held[:cut], end="", flush=True)
+                held = held[cut:]
+            blocked = screen.match or screen.finish()
+            print("" if blocked else held)
+            if blocked:
+                answer = OUTPUT_BLOCKED_MESSAGE
+                print(f"[Answer withheld] {answer}")
+            else:
+                semantic_cache.store(standalone_query, answer, source_documents, vector=query_vector)
+        memory.update(user_query, standalone_query, answer)
+
+        print("\nSOURCE DOCUMENTS:")
+        for i, doc in enumerate(source_documents):
+            print(f"\nSource {i+1}: {doc.metadata.get('source', 'Unknown')}")
+            print(f"Content snippet: {doc.page_content[:150]}...")
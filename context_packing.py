@@ -0,0 +1,145 @@
+import re
+import hashlib
+import threading
+from typing import Any, List
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+import tracing
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Constants
+CONTEXT_TOKEN_BUDGET = 600  # roughly five 500-character chunks
+CANDIDATES_PER_RESULT = 3  # retrieve k * this many chunks to pack from
+MMR_LAMBDA = 0.7  # 1.0 ranks by relevance only, 0.0 by novelty only
+NEAR_DUPLICATE_BITS = 4  # SimHash bits (of 64) two chunks may differ in and still count as duplicates
+MIN_MERGE_OVERLAP = 20  # characters a chunk must share with its neighbour to be merged into it
+TIKTOKEN_ENCODING = "cl100k_base"
+CHARS_PER_TOKEN = 4  # estimate when tiktoken is unavailable
+
+SHINGLE_PATTERN = re.compile(r"\w+")
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text):
+    """Token count with tiktoken when its encoding can be loaded, a character estimate otherwise.
+
+    The served model has its own tokenizer; cl100k counts are close enough to
+    keep prompts within a budget.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                if tiktoken is not None:
+                    try:
+                        _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+                    except Exception as e:
+                        print(f"Could not load the {TIKTOKEN_ENCODING} encoding ({type(e).__name__}); estimating tokens")
+                _encoding_loaded = True
+    if _encoding is None:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def simhash(text):
+    """64-bit SimHash over word trigrams; near-duplicate texts differ in only a few bits"""
+    words = SHINGLE_PATTERN.findall(text.lower())
+    shingles = {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), "little") for s in shingles],
+        dtype=np.uint64,
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0) * 2 > len(hashes)
+    return int.from_bytes(np.packbits(votes, bitorder="little").tobytes(), "little")
+
+
+def similarity(a, b):
+    """Fraction of equal SimHash bits"""
+    return 1.0 - bin(a ^ b).count("1") / 64
+
+
+def overlap_length(left, right):
+    """Length of the longest suffix of left that starts right (the splitter's chunk overlap)"""
+    for size in range(min(len(left), len(right)), MIN_MERGE_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_adjacent(documents):
+    """Join chunks of the same source that overlap end-to-start into one passage"""
+    passages = []
+    for doc in documents:
+        source = doc.metadata.get("source")
+        for i, passage in enumerate(passages):
+            if passage.metadata.get("source") != source:
+                continue
+            text = passage.page_content
+            after = overlap_length(text, doc.page_content)
+            before = 0 if after else overlap_length(doc.page_content, text)
+            if after or before:
+                merged = text + doc.page_content[after:] if after else doc.page_content + text[before:]
+                passages[i] = Document(page_content=merged, metadata=dict(
+                    passage.metadata, chunk_ids=passage.metadata.get("chunk_ids", [passage.metadata.get("chunk_id")])
+                    + [doc.metadata.get("chunk_id")],
+                ))
+                break
+        else:
+            passages.append(doc)
+    return passages
+
+
+def pack_context(documents, token_budget=CONTEXT_TOKEN_BUDGET, mmr_lambda=MMR_LAMBDA):
+    """Pick from ranked chunks what fits the token budget, dropping near-duplicates and diversifying with MMR.
+
+    Relevance comes from the retriever's ranking; redundancy is SimHash
+    similarity to the chunks already picked. Picked chunks that continue each
+    other are merged back into one passage, which also drops their overlap.
+    """
+    candidates = []
+    for rank, doc in enumerate(documents):
+        signature = simhash(doc.page_content)
+        if any(similarity(signature, other["signature"]) >= 1 - NEAR_DUPLICATE_BITS / 64 for other in candidates):
+            continue
+        candidates.append({"doc": doc, "signature": signature, "tokens": count_tokens(doc.page_content),
+                           "relevance": 1.0 - rank / max(1, len(documents))})
+
+    selected = []
+    used = 0
+    while candidates:
+        def mmr(candidate):
+            redundancy = max((similarity(candidate["signature"], s["signature"]) for s in selected), default=0.0)
+            return mmr_lambda * candidate["relevance"] - (1 - mmr_lambda) * redundancy
+        best = max(candidates, key=mmr)
+        candidates.remove(best)
+        if used + best["tokens"] > token_budget:
+            continue  # a shorter chunk further down may still fit
+        selected.append(best)
+        used += best["tokens"]
+    return merge_adjacent([item["doc"] for item in selected])
+
+
+class PackedRetriever(BaseRetriever):
+    """Wraps a retriever that over-fetches candidates and packs them into the context budget"""
+    retriever: Any
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+    mmr_lambda: float = MMR_LAMBDA
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.pack(self.retriever.invoke(query))
+
+    def pack(self, documents):
+        with tracing.span("pack_context", candidates=len(documents)) as pack_span:
+            packed = pack_context(documents, self.token_budget, self.mmr_lambda)
+            pack_span.set(passages=len(packed))
+        return packed
@@ -0,0 +1,140 @@
+import re
+import time
+import threading
+from collections import OrderedDict, deque
+from context_packing import count_tokens
+
+# Constants
+SUMMARY_TURNS = 3  # recent turns summarised one line each; older ones survive only as topics
+SUMMARY_TOKEN_BUDGET = 120
+MAX_TOPICS = 12
+TOPIC_DECAY = 0.7  # weight kept by older topics each turn
+MAX_QUERY_WORDS = 16
+ANSWER_GIST_CHARS = 160
+MIN_GIST_SENTENCE_CHARS = 60  # shorter opening sentences are the prompt's encouraging line, not content
+MAX_SESSIONS = 1000
+SESSION_TTL = 2 * 3600  # seconds
+
+WORD_PATTERN = re.compile(r"[\w'+#.-]+")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+# Only unambiguous references make a follow-up; "is there", "it" or "more" also open fresh questions
+FOLLOW_UP_PREFIXES = ("what about", "how about", "and what about", "and how about", "what else", "anything else",
+                      "any more of")
+REFERRING_WORDS = frozenset(["them", "those", "these", "ones"])
+FOLLOW_UP_WORDS = REFERRING_WORDS | frozenset(word for prefix in FOLLOW_UP_PREFIXES for word in prefix.split())
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be been being below between both but by can could
+do does doing for from had has have having he her here hers him his how i if in into is me more most my
+no not of on or our ours out over own she should so some such than that the then there these they this
+those to too under until up very was we were what when where which while who whom why will with would
+you your yours please tell show find give want need looking look like know get also ok okay thanks thank
+hi hello hey asha
+""".split())
+
+
+def content_words(text):
+    words = (word.strip(".-'") for word in WORD_PATTERN.findall(text.lower()))
+    return [word for word in words if word and word not in STOPWORDS]
+
+
+class ConversationMemory:
+    """Fixed-size conversation state for one session.
+
+    Instead of the raw transcript it keeps the user's last question that was
+    not a follow-up, one short line per recent turn and a decaying set of
+    topic words, so both the prompt it contributes and its memory stay flat
+    however long the chat runs.
+    """
+    def __init__(self, summary_turns=SUMMARY_TURNS, summary_tokens=SUMMARY_TOKEN_BUDGET, max_topics=MAX_TOPICS):
+        self.summary_tokens = summary_tokens
+        self.max_topics = max_topics
+        self.topic_query = None  # the user's words, never a rewrite, so rewrites cannot pile up
+        self.recent = deque(maxlen=summary_turns)
+        self.topics = {}
+        self.turns = 0
+        self.last_used = time.time()
+
+    def is_follow_up(self, query):
+        """Whether the query clearly refers back ("what about X", "those", "ones") to the previous question"""
+        if self.topic_query is None:
+            return False
+        text = " ".join(WORD_PATTERN.findall(query.lower()))
+        return text.startswith(FOLLOW_UP_PREFIXES) or any(word in REFERRING_WORDS for word in text.split())
+
+    def standalone_query(self, query):
+        """Rewrite a follow-up ("what about remote ones?") into a query that retrieves on its own.
+
+        New words of the follow-up come first, then the words of the user's
+        last question that was not itself a follow-up, so a chain of
+        follow-ups ("what about remote ones?", "what about part-time ones?")
+        each merge with the same question instead of with each other.
+        """
+        if not self.is_follow_up(query):
+            return query
+        words = [word for word in content_words(query) if word not in FOLLOW_UP_WORDS]
+        for word in content_words(self.topic_query):
+            if word not in words:
+                words.append(word)
+        return " ".join(words[:MAX_QUERY_WORDS]) or self.topic_query
+
+    def summary(self):
+        """Compact description of the conversation so far, within the summary token budget"""
+        lines = []
+        older = [word for word, _ in sorted(self.topics.items(), key=lambda item: -item[1])]
+        if older and self.turns > len(self.recent):
+            lines.append("Earlier topics: " + ", ".join(older))
+        lines.extend(self.recent)
+        # Drop the oldest lines first until the summary fits
+        while lines and count_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def prompt_question(self, query):
+        """The question as sent to the LLM: the user's words with the conversation summary in front"""
+        summary = self.summary()
+        if not summary:
+            return query
+        return f"(Conversation so far:\n{summary})\n{query}"
+
+    def update(self, query, standalone, answer):
+        """Fold a finished turn (the user's query, its standalone rewrite and the answer) into the summary"""
+        sentences = SENTENCE_END.split(" ".join(answer.split()))
+        gist = next((s for s in sentences if len(s) >= MIN_GIST_SENTENCE_CHARS), sentences[-1])[:ANSWER_GIST_CHARS]
+        self.recent.append(f"User asked: {standalone}" + (f" | Asha: {gist}" if gist else ""))
+        if not self.is_follow_up(query):
+            self.topic_query = query
+        self.turns += 1
+        self.last_used = time.time()
+        for word in list(self.topics):
+            self.topics[word] *= TOPIC_DECAY
+        for word in content_words(standalone):
+            self.topics[word] = self.topics.get(word, 0.0) + 1.0
+        if len(self.topics) > self.max_topics:
+            keep = sorted(self.topics, key=self.topics.get, reverse=True)[:self.max_topics]
+            self.topics = {word: self.topics[word] for word in keep}
+
+
+class SessionMemories:
+    """ConversationMemory per session id, for servers that see many sessions.
+
+    Idle sessions expire after SESSION_TTL and the least recently used are
+    dropped beyond MAX_SESSIONS, so total memory is bounded too.
+    """
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+
+    def get(self, session_id):
+        now = time.time()
+        with self.lock:
+            memory = self.sessions.get(session_id)
+            if memory is None or now - memory.last_used > self.ttl:
+                memory = ConversationMemory()
+            self.sessions[session_id] = memory
+            self.sessions.move_to_end(session_id)
+            memory.last_used = now
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+            return memory
@@ -0,0 +1,159 @@
+import time
+import queue
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from html_extraction import EXTRACT_PROCESSES, create_extraction_pool, extract_text
+
+# Constants
+MAX_DOMAIN_WORKERS = 8
+PARSE_WORKERS = 4
+MAX_RETRIES = 3
+BACKOFF_BASE = 2.0  # seconds
+BACKOFF_MAX = 60.0  # seconds
+
+
+class CrawlEngine:
+    """Fetches many URLs concurrently while staying polite to each domain.
+
+    Every domain gets a single worker that fetches its URLs one after another,
+    so the scraper's per-domain delay still applies. Different domains are
+    fetched in parallel, and HTML extraction runs on a separate pool so that
+    parsing overlaps with the next network wait. With extract_processes > 1
+    the CPU-bound extraction itself is fanned out over a process pool.
+    """
+    def __init__(self, scraper, max_domain_workers=MAX_DOMAIN_WORKERS, parse_workers=PARSE_WORKERS,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, extract_processes=EXTRACT_PROCESSES):
+        self.scraper = scraper
+        self.max_domain_workers = max_domain_workers
+        self.parse_workers = max(parse_workers, extract_processes)
+        self.extract_processes = extract_processes
+        self.extract_pool = None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+    def _fetch_with_retry(self, url, force_refresh):
+        """Fetch a URL, retrying failed attempts with exponential backoff"""
+        for attempt in range(1, self.max_retries + 2):
+            result = self.scraper.fetch(url, force_refresh=force_refresh)
+            if result["html"] is not None or attempt > self.max_retries:
+                return result, attempt
+            delay = min(BACKOFF_MAX, self.backoff_base * (2 ** (attempt - 1)))
+            delay += random.uniform(0, delay / 2)
+            print(f"Retrying {url} in {delay:.1f}s (attempt {attempt + 1})")
+            time.sleep(delay)
+        return result, self.max_retries + 1
+
+    def _parse(self, url, result, selectors, timing):
+        """Extract text, reusing the cached extraction when the html is unchanged"""
+        start = time.perf_counter()
+        content = self.scraper.load_extracted(url, result["content_hash"], selectors)
+        timing["reused"] = content is not None
+        if content is None:
+            if self.extract_pool is not None:
+                content = self.extract_pool.submit(extract_text, result["html"], selectors).result()
+            else:
+                content = self.scraper.extract_content(result["html"], selectors)
+            self.scraper.save_extracted(url, result["content_hash"], selectors, content)
+        timing["parse_s"] = time.perf_counter() - start
+        return content
+
+    def _crawl_domain(self, url_infos, force_refresh, parse_pool, slots, stop, done):
+        """Fetch all URLs of one domain sequentially, handing HTML off for parsing"""
+        for url_info in url_infos:
+            # Wait for a free slot so fetched pages cannot pile up ahead of the consumer
+            while not slots.acquire(timeout=0.1):
+                if stop.is_set():
+                    return
+            url = url_info.get("url")
+            print(f"Fetching {url}...")
+            start = time.perf_counter()
+            result, attempts = self._fetch_with_retry(url, force_refresh)
+            timing = {
+                "url": url,
+                "status": result["status"],
+                "fetch_s": time.perf_counter() - start,
+                "parse_s": 0.0,
+                "attempts": attempts,
+                "reused": False,
+                "ok": result["html"] is not None,
+            }
+            if result["html"]:
+                parse_pool.submit(self._parse_into, url_info, result, timing, done)
+            else:
+                timing["total_s"] = timing["fetch_s"]
+                done.put((url_info, None, timing))
+
+    def _parse_into(self, url_info, result, timing, done):
+        content = None
+        try:
+            content = self._parse(url_info.get("url"), result, url_info.get("selectors"), timing)
+        except Exception as e:
+            print(f"Error extracting {url_info.get('url')}: {e}")
+            timing["ok"] = False
+        timing["total_s"] = timing["fetch_s"] + timing["parse_s"]
+        done.put((url_info, content, timing))
+
+    def stream(self, url_infos, force_refresh=False, max_pending=None):
+        """Yield (url_info, content, timing) for each url entry as soon as it is extracted.
+
+        Entries come out in completion order. At most max_pending fetched pages
+        wait for extraction or for the caller at any time; domain workers block
+        before fetching more, so memory stays flat however many URLs are
+        configured and a slow consumer slows the crawl down.
+        """
+        by_domain = OrderedDict()
+        for url_info in url_infos:
+            if not url_info.get("url"):
+                continue
+            domain = urlparse(url_info["url"]).netloc
+            by_domain.setdefault(domain, []).append(url_info)
+        remaining = sum(len(entries) for entries in by_domain.values())
+
+        slots = threading.Semaphore(max_pending or 2 * self.parse_workers)
+        stop = threading.Event()
+        done = queue.Queue()
+        self.extract_pool = create_extraction_pool(self.extract_processes)
+        parse_pool = ThreadPoolExecutor(max_workers=self.parse_workers)
+        fetch_pool = ThreadPoolExecutor(max_workers=max(1, min(self.max_domain_workers, len(by_domain))))
+        try:
+            domain_futures = [
+                fetch_pool.submit(self._crawl_domain, entries, force_refresh, parse_pool, slots, stop, done)
+                for entries in by_domain.values()
+            ]
+            while remaining:
+                try:
+                    item = done.get(timeout=0.5)
+                except queue.Empty:
+                    for future in domain_futures:
+                        if future.done() and future.exception() is not None:
+                            future.result()
+                    continue
+                remaining -= 1
+                slots.release()
+                yield item
+        finally:
+            stop.set()
+            fetch_pool.shutdown()
+            parse_pool.shutdown()
+            if self.extract_pool is not None:
+                self.extract_pool.shutdown()
+                self.extract_pool = None
+
+
+def print_timing_report(timings):
+    """Print per-URL fetch/parse timings and a summary line"""
+    print(f"{'status':>12} {'fetch':>8} {'parse':>8} {'tries':>5}  url")
+    for timing in timings:
+        note = " (extraction reused)" if timing["reused"] else ""
+        print(f"{timing['status']:>12} {timing['fetch_s']:8.2f} {timing['parse_s']:8.2f} "
+              f"{timing['attempts']:5d}  {timing['url']}{note}")
+    if timings:
+        failed = sum(1 for timing in timings if not timing["ok"])
+        unchanged = sum(1 for timing in timings if timing["status"] in ("cached", "not_modified"))
+        fetch_total = sum(timing["fetch_s"] for timing in timings)
+        parse_total = sum(timing["parse_s"] for timing in timings)
+        print(f"Crawled {len(timings)} URLs ({failed} failed, {unchanged} unchanged): "
+              f"{fetch_total:.1f}s fetching, {parse_total:.1f}s parsing (summed across workers)")
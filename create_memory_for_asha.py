@@ -1,39 +1,100 @@
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
 import os
 import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 import time
 import hashlib
 import json
+import shutil
+import argparse
+import threading
+from crawler import CrawlEngine, print_timing_report
+from html_extraction import extract_text
+from embedding_service import EMBEDDING_MODEL_NAME, get_embedding_model
+from hybrid_retrieval import BM25Index
+from partition_index import PartitionBuilder
+from ingest_pipeline import EMBED_BATCH_SIZE, IngestPipeline
+from vector_storage import VectorstoreWriter, load_vectorstore
+from ann_index import (INDEX_TYPES, QUANTIZED_TYPES, DEFAULT_NPROBE, DEFAULT_PQ_M, DEFAULT_HNSW_M, DEFAULT_EF_SEARCH,
+                       DEFAULT_RESCORE_FACTORS, build_ann_index, built_index_type, describe_index,
+                       estimate_memory_bytes, flat_vectors)
 
 # Constants
 DATA_PATH = "data/"
 CACHE_DIR = os.path.join(DATA_PATH, "cache")
 DB_FAISS_PATH = "vectorstore/db_faiss"
+VERSIONS_DIR = "vectorstore/versions"
+KEEP_VERSIONS = 3  # older versions may still be served by long-running processes
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
 USER_AGENT = "AshaBot/1.0 (Educational Project)"
 MIN_SCRAPE_DELAY = 10  # seconds
+CACHE_TTL = 24 * 3600  # seconds before a cached page is revalidated
+CACHE_MAX_AGE = 30 * 24 * 3600  # seconds unused before a cached page is evicted
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+EXTRACTOR_VERSION = 2
 
 # Create necessary directories
 os.makedirs(DATA_PATH, exist_ok=True)
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+def content_hash(text):
+    """Stable hash of a piece of text"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
 class WebContentScraper:
     """Responsible for fetching and parsing website content"""
     def __init__(self, cache_dir=CACHE_DIR):
         self.cache_dir = cache_dir
         self.domain_last_access = {}
 
-    def fetch_url(self, url, force_refresh=False):
-        """Fetch URL content with caching and rate limiting"""
+    def _cache_paths(self, url):
+        """Return the (html, metadata sidecar, extracted text) cache paths for a URL"""
         url_hash = hashlib.md5(url.encode()).hexdigest()
-        cache_file = os.path.join(self.cache_dir, f"{url_hash}.html")
+        base = os.path.join(self.cache_dir, url_hash)
+        return f"{base}.html", f"{base}.meta.json", f"{base}.txt"
+
+    def _load_meta(self, meta_file):
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_atomic(self, path, text):
+        """Replace a cache file in one step; the temp name is per thread, as workers may share a URL"""
+        tmp_file = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_file, path)
 
-        if os.path.exists(cache_file) and not force_refresh:
+    def _save_meta(self, meta_file, meta):
+        self._write_atomic(meta_file, json.dumps(meta, indent=2))
+
+    def fetch(self, url, force_refresh=False):
+        """Fetch URL content, revalidating cached copies with conditional requests.
+
+        Returns a dict with the html, a status of 'cached', 'not_modified',
+        'fetched' or 'error', and the content hash of the html.
+        """
+        cache_file, meta_file, _ = self._cache_paths(url)
+        cached_html = None
+        meta = {}
+
+        if os.path.exists(cache_file):
             with open(cache_file, 'r', encoding='utf-8') as f:
-                return f.read()
+                cached_html = f.read()
+            # Entries written before the sidecar existed have no validators
+            meta = self._load_meta(meta_file) or {
+                "url": url,
+                "content_hash": content_hash(cached_html),
+                "fetched_at": os.path.getmtime(cache_file),
+            }
+            if not force_refresh and time.time() - meta.get("fetched_at", 0) < CACHE_TTL:
+                meta["last_used"] = time.time()
+                self._save_meta(meta_file, meta)
+                return {"html": cached_html, "status": "cached", "content_hash": meta["content_hash"]}
 
         # Rate limit by domain
         domain = urlparse(url).netloc
@@ -44,100 +105,397 @@ class WebContentScraper:
 
         try:
             headers = {'User-Agent': USER_AGENT}
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            if cached_html is not None:
+                if meta.get("etag"):
+                    headers['If-None-Match'] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers['If-Modified-Since'] = meta["last_modified"]
+            try:
+                response = requests.get(url, headers=headers, timeout=10)
+            finally:
+                # Failed attempts count against the politeness budget too
+                self.domain_last_access[domain] = time.time()
+
+            now = time.time()
+            if response.status_code == 304 and cached_html is not None:
+                meta["fetched_at"] = meta["last_used"] = now
+                self._save_meta(meta_file, meta)
+                return {"html": cached_html, "status": "not_modified", "content_hash": meta["content_hash"]}
 
-            self.domain_last_access[domain] = time.time()
+            response.raise_for_status()
 
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                f.write(response.text)
+            self._write_atomic(cache_file, response.text)
 
-            return response.text
+            meta.update({
+                "url": url,
+                "etag": response.headers.get('ETag'),
+                "last_modified": response.headers.get('Last-Modified'),
+                "fetched_at": now,
+                "last_used": now,
+                "content_hash": content_hash(response.text),
+            })
+            self._save_meta(meta_file, meta)
+            return {"html": response.text, "status": "fetched", "content_hash": meta["content_hash"]}
 
         except Exception as e:
             print(f"Error fetching {url}: {e}")
+            return {"html": None, "status": "error", "content_hash": None}
+
+    def fetch_url(self, url, force_refresh=False):
+        """Fetch URL content with caching and rate limiting"""
+        return self.fetch(url, force_refresh=force_refresh)["html"]
+
+    def _extraction_key(self, html_hash, content_selectors):
+        return content_hash(f"{EXTRACTOR_VERSION}:{html_hash}:{json.dumps(content_selectors)}")
+
+    def load_extracted(self, url, html_hash, content_selectors=None):
+        """Return previously extracted text if the html and selectors are unchanged"""
+        _, meta_file, text_file = self._cache_paths(url)
+        meta = self._load_meta(meta_file)
+        if not meta or meta.get("extraction_key") != self._extraction_key(html_hash, content_selectors):
             return None
+        try:
+            with open(text_file, 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save_extracted(self, url, html_hash, content_selectors, text):
+        """Cache extracted text next to the html it was extracted from"""
+        _, meta_file, text_file = self._cache_paths(url)
+        meta = self._load_meta(meta_file)
+        if meta is None:
+            return
+        self._write_atomic(text_file, text)
+        meta["extraction_key"] = self._extraction_key(html_hash, content_selectors)
+        self._save_meta(meta_file, meta)
+
+    def evict_cache(self, max_age=CACHE_MAX_AGE, max_bytes=CACHE_MAX_BYTES):
+        """Drop cache entries unused for max_age seconds, then the least recently used ones over max_bytes"""
+        entries = {}
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not os.path.isfile(path):
+                continue
+            entry = entries.setdefault(name.split('.', 1)[0], {"files": [], "size": 0, "last_used": 0})
+            entry["files"].append(path)
+            entry["size"] += os.path.getsize(path)
+            if name.endswith(".meta.json"):
+                meta = self._load_meta(path) or {}
+                entry["last_used"] = max(entry["last_used"], meta.get("last_used", meta.get("fetched_at", 0)))
+            else:
+                entry["last_used"] = max(entry["last_used"], os.path.getmtime(path))
+
+        now = time.time()
+        total = sum(entry["size"] for entry in entries.values())
+        evicted = 0
+        for entry in sorted(entries.values(), key=lambda e: e["last_used"]):
+            if now - entry["last_used"] <= max_age and total <= max_bytes:
+                break
+            for path in entry["files"]:
+                os.remove(path)
+            total -= entry["size"]
+            evicted += 1
+        if evicted:
+            print(f"Evicted {evicted} cache entries; cache is now {total / 1e6:.1f} MB")
+        return evicted
 
     def extract_content(self, html, content_selectors=None):
         """Extract meaningful text content"""
-        soup = BeautifulSoup(html, 'html.parser')
-
-        # Remove junk
-        for element in soup.select('script, style, nav, footer, header, [class*="ads"], [id*="ads"]'):
-            element.decompose()
-
-        if content_selectors:
-            extracted_content = []
-            for selector in content_selectors:
-                elements = soup.select(selector)
-                for element in elements:
-                    extracted_content.append(element.get_text(strip=True, separator=' '))
-            if extracted_content:
-                return ' '.join(extracted_content)
-
-        # Default fallback
-        main_content = soup.select('main, article, .content, #content, .post, .article')
-        if main_content:
-            return ' '.join([el.get_text(strip=True, separator=' ') for el in main_content])
-
-        body = soup.find('body')
-        return body.get_text(strip=True, separator=' ') if body else ''
-
-def load_website_data(urls_file="data/urls.json", force_refresh=False):
-    """Load website data from URLs"""
-    documents = []
-    scraper = WebContentScraper()
+        return extract_text(html, content_selectors)
 
+def load_url_config(urls_file="data/urls.json"):
+    """Load the list of URL entries to crawl"""
     try:
         with open(urls_file, 'r') as f:
-            urls_data = json.load(f)
+            return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         print(f"Error: Could not load {urls_file}")
-        urls_data = []
-
-    for url_info in urls_data:
-        url = url_info.get("url")
-        print(f"Fetching {url}...")
-
-        html = scraper.fetch_url(url, force_refresh=force_refresh)
-        if html:
-            content = scraper.extract_content(html, url_info.get("selectors"))
-            if content:
-                metadata = {
-                    "source": url,
-                    "type": url_info.get("type", "general"),
-                    "title": url_info.get("title", url),
-                }
-                documents.append({"page_content": content, "metadata": metadata})
+        return []
+
+def stream_website_data(urls_data, scraper, force_refresh=False, timings=None):
+    """Yield document dicts as pages are fetched and extracted, appending each page's timing to timings"""
+    for url_info, content, timing in CrawlEngine(scraper).stream(urls_data, force_refresh=force_refresh):
+        if timings is not None:
+            timings.append(timing)
+        if content:
+            url = url_info.get("url")
+            metadata = {
+                "source": url,
+                "type": url_info.get("type", "general"),
+                "title": url_info.get("title", url),
+            }
+            yield {"page_content": content, "metadata": metadata}
 
+def load_website_data(urls_file="data/urls.json", force_refresh=False, report_timing=True):
+    """Load website data from URLs, crawling different domains concurrently"""
+    scraper = WebContentScraper()
+    timings = []
+    documents = list(stream_website_data(load_url_config(urls_file), scraper, force_refresh, timings))
+    if report_timing:
+        print_timing_report(timings)
+    scraper.evict_cache()
     return documents
 
+class ChunkSplitter:
+    """Splits documents into chunks tagged with a content-derived chunk_id"""
+    def __init__(self, chunk_size=500, chunk_overlap=50):
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.seen = {}
+
+    def __call__(self, document):
+        chunks = self.splitter.split_documents(
+            [Document(page_content=document["page_content"], metadata=document["metadata"])]
+        )
+        # Identical text repeated within a page gets an occurrence suffix so ids stay unique
+        for chunk in chunks:
+            key = content_hash(chunk.metadata.get("source", "") + "\n" + chunk.page_content)
+            self.seen[key] = self.seen.get(key, 0) + 1
+            chunk.metadata["chunk_id"] = key if self.seen[key] == 1 else f"{key}-{self.seen[key]}"
+        return chunks
+
 def create_chunks(documents):
-    """Split text into chunks"""
-    from langchain.schema import Document
-    langchain_docs = [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in documents]
+    """Split text into chunks, tagging each with a content-derived chunk_id"""
+    split = ChunkSplitter()
+    return [chunk for doc in documents for chunk in split(doc)]
+
+def load_manifest(db_path=DB_FAISS_PATH):
+    """Load the build manifest stored next to the index, or None if missing/unusable"""
+    manifest_path = os.path.join(db_path, MANIFEST_FILE)
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("embedding_model") != EMBEDDING_MODEL_NAME:
+        return None
+    return manifest
+
+class IndexBuilder:
+    """Pipeline sink that appends chunks to a staged vectorstore, its BM25 index and the manifest"""
+    def __init__(self, staging_path):
+        self.staging_path = staging_path
+        self.writer = VectorstoreWriter(staging_path)
+        self.bm25 = BM25Index()
+        self.partitions = PartitionBuilder()
+        self.urls = {}
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    chunks = splitter.split_documents(langchain_docs)
-    return chunks
+    def track(self, documents):
+        """Pass documents through, recording each page's content hash for the manifest"""
+        for doc in documents:
+            entry = self.urls.setdefault(doc["metadata"]["source"], {"chunk_ids": []})
+            entry["content_hash"] = content_hash(doc["page_content"])
+            yield doc
 
-def get_embedding_model():
-    """Load HuggingFace Embedding Model"""
-    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    def add(self, chunks, vectors):
+        ids = [chunk.metadata["chunk_id"] for chunk in chunks]
+        self.partitions.add(len(self.writer), chunks)
+        self.writer.add(chunks, vectors, ids)
+        for chunk_id, chunk in zip(ids, chunks):
+            self.bm25.add(chunk_id, chunk)
+            self.urls.setdefault(chunk.metadata["source"], {"chunk_ids": []})["chunk_ids"].append(chunk_id)
 
-def main():
-    documents = load_website_data(force_refresh=True)
-    print(f"Loaded {len(documents)} documents.")
+    def keep(self, url, entry, chunks, embedding_model):
+        """Carry chunks over from the previous index unchanged"""
+        for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+            batch = chunks[start:start + EMBED_BATCH_SIZE]
+            self.add(batch, embedding_model.embed_vectors([chunk.page_content for chunk in batch]))
+        self.urls[url] = entry
+
+    def manifest(self):
+        """Per-URL content hashes and the chunk ids derived from each URL"""
+        return {
+            "version": MANIFEST_VERSION,
+            "embedding_model": EMBEDDING_MODEL_NAME,
+            "built_at": time.time(),
+            "urls": self.urls,
+        }
+
+    def finish(self, index=None):
+        """Write the index (or a replacement built from it), BM25 index, partitions and manifest to the staging directory"""
+        self.writer.close(index)
+        self.partitions.save(self.staging_path, self.writer.index, served_index=index)
+        self.bm25.refresh_stats()
+        self.bm25.save(self.staging_path)
+        with open(os.path.join(self.staging_path, MANIFEST_FILE), 'w') as f:
+            json.dump(self.manifest(), f, indent=2)
+
+def new_staging_path(versions_dir=VERSIONS_DIR):
+    """Directory for the next index version; publish_index renames it to its final name"""
+    os.makedirs(versions_dir, exist_ok=True)
+    version = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+    return os.path.join(versions_dir, f"{version}.tmp")
+
+def publish_index(staging_path, db_path=DB_FAISS_PATH, versions_dir=VERSIONS_DIR):
+    """Turn a fully written staging directory into a version and atomically point db_path at it.
+
+    db_path is a symlink into versions_dir; replacing a symlink is atomic, and
+    processes that loaded an older version keep reading it (load_vectorstore
+    resolves the link), so nothing is pulled out from under live chats.
+    Returns the version directory.
+    """
+    version_path = staging_path[:-len(".tmp")] if staging_path.endswith(".tmp") else staging_path
+    if version_path != staging_path:
+        os.rename(staging_path, version_path)
+
+    link_path = f"{db_path}.link-{os.getpid()}"
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    try:
+        os.symlink(os.path.relpath(version_path, os.path.dirname(db_path) or "."), link_path,
+                   target_is_directory=True)
+    except (OSError, NotImplementedError):
+        # No symlinks (e.g. Windows without developer mode): swap a copy in with directory renames
+        copy_path = f"{db_path}.tmp-{os.getpid()}"
+        backup_path = f"{db_path}.old-{os.getpid()}"
+        shutil.copytree(version_path, copy_path)
+        if os.path.exists(db_path):
+            os.rename(db_path, backup_path)
+        os.rename(copy_path, db_path)
+        shutil.rmtree(backup_path, ignore_errors=True)
+        return version_path
 
-    chunks = create_chunks(documents)
-    print(f"Created {len(chunks)} text chunks.")
+    if os.path.isdir(db_path) and not os.path.islink(db_path):
+        # First versioned build: keep the old unversioned index as a version of its own
+        built_at = time.localtime(os.path.getmtime(db_path))
+        os.rename(db_path, os.path.join(versions_dir, time.strftime("%Y%m%d-%H%M%S", built_at) + "-unversioned"))
+    os.replace(link_path, db_path)
+    prune_versions(db_path, versions_dir)
+    return version_path
 
+def prune_versions(db_path=DB_FAISS_PATH, versions_dir=VERSIONS_DIR, keep=KEEP_VERSIONS):
+    """Delete all but the newest `keep` versions, never the one db_path points at"""
+    current = os.path.realpath(db_path)
+    versions = sorted(
+        (os.path.join(versions_dir, name) for name in os.listdir(versions_dir) if not name.endswith(".tmp")),
+        key=os.path.getmtime, reverse=True,
+    )
+    for path in versions[keep:]:
+        if os.path.realpath(path) != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+def keep_unfetched_urls(builder, manifest, embedding_model, db_path=DB_FAISS_PATH):
+    """Keep the previous chunks of configured URLs that failed to fetch this run"""
+    configured = {url_info.get("url") for url_info in load_url_config()}
+    kept = [(url, entry) for url, entry in manifest["urls"].items() if url in configured and url not in builder.urls]
+    if not kept:
+        return
+    old_db = load_vectorstore(db_path, embedding_model)
+    for url, entry in kept:
+        print(f"Keeping previous chunks for {url} (not fetched this run)")
+        chunks = [old_db.docstore.search(chunk_id) for chunk_id in entry["chunk_ids"]]
+        builder.keep(url, entry, [chunk for chunk in chunks if isinstance(chunk, Document)], embedding_model)
+
+def apply_index_type(index, index_type, ann_params):
+    """Build the requested ANN index type from a flat index"""
+    vectors = flat_vectors(index)
+    start = time.time()
+    ann_index = build_ann_index(vectors, index_type, **ann_params)
+    built_type = built_index_type(ann_index)
+    estimate = estimate_memory_bytes(built_type, len(vectors), index.d, **{
+        key: value for key, value in ann_params.items() if key in ("nlist", "pq_m", "pq_nbits", "hnsw_m")
+    })
+    size = f"~{estimate / 1e6:.1f} MB"
+    if built_type in QUANTIZED_TYPES:
+        size += f" scanned, plus {vectors.nbytes / 1e6:.1f} MB of float vectors for rescoring"
+    print(f"Built {describe_index(ann_index)} index over {len(vectors)} vectors in {time.time() - start:.1f}s "
+          f"({size})")
+    return ann_index
+
+def main(keep_unfetched=False, index_type="flat", ann_params=None, progress=None):
+    """Crawl, build and publish a new index version; returns its directory, or None if nothing was built.
+
+    Every build fetches all configured URLs and writes a complete new index;
+    only the embeddings of unchanged chunks are reused, from the embedding
+    cache. keep_unfetched additionally carries over the previous chunks of
+    URLs that fail to fetch, instead of dropping them, and reports what changed.
+    progress, if given, is called as progress(fraction, message) while the build runs.
+    """
+    report = progress or (lambda fraction, message: None)
     embedding_model = get_embedding_model()
-    db = FAISS.from_documents(chunks, embedding_model)
+    manifest = load_manifest() if keep_unfetched else None
+    if keep_unfetched and manifest is None:
+        print("No usable manifest found; URLs that fail to fetch will be left out of this build.")
+
+    urls_data = load_url_config()
+    staging_path = new_staging_path()
+    scraper = WebContentScraper()
+    timings = []
+    builder = IndexBuilder(staging_path)
+
+    def on_progress(stats):
+        # Crawling dominates; keep the last 10% for the index build and swap
+        report(0.9 * len(timings) / max(1, len(urls_data)),
+               f"Crawled {len(timings)}/{len(urls_data)} pages, indexed {stats['index'].items} chunks")
+
+    report(0.0, "Starting crawl")
+    # fetch -> extract -> split -> embed in batches -> add, with bounded queues between the stages
+    pipeline = IngestPipeline(
+        builder.track(stream_website_data(urls_data, scraper, force_refresh=True, timings=timings)),
+        ChunkSplitter(),
+        embedding_model.embed_vectors,
+        builder.add,
+        on_progress=on_progress,
+    )
+    try:
+        pipeline.run()
+    except BaseException:
+        builder.writer.close()
+        shutil.rmtree(staging_path, ignore_errors=True)
+        raise
+    print_timing_report(timings)
+    pipeline.print_report()
+    scraper.evict_cache()
+
+    print(f"Loaded {len(builder.urls)} documents into {len(builder.writer)} text chunks.")
+    if not len(builder.writer):
+        print("No content to index; leaving the existing vector database untouched.")
+        builder.writer.close()
+        shutil.rmtree(staging_path, ignore_errors=True)
+        return None
+
+    if manifest is not None:
+        keep_unfetched_urls(builder, manifest, embedding_model)
+        old_ids = {chunk_id for entry in manifest["urls"].values() for chunk_id in entry["chunk_ids"]}
+        new_ids = {chunk_id for entry in builder.urls.values() for chunk_id in entry["chunk_ids"]}
+        print(f"Since the last build: {len(new_ids - old_ids)} chunks added, {len(old_ids - new_ids)} removed, "
+              f"{len(new_ids & old_ids)} unchanged.")
+
+    report(0.9, "Building search indexes")
+    index = None
+    if index_type != "flat":
+        index = apply_index_type(builder.writer.index, index_type, ann_params or {})
+
+    print(f"Embeddings: {embedding_model.cache_misses} computed, {embedding_model.cache_hits} reused from cache.")
+    builder.finish(index)
+    print(f"Built BM25 index over {len(builder.bm25.doc_ids)} chunks.")
 
-    os.makedirs(os.path.dirname(DB_FAISS_PATH), exist_ok=True)
-    db.save_local(DB_FAISS_PATH)
-    print(f"Saved vector database to {DB_FAISS_PATH}")
+    version_path = publish_index(staging_path)
+    print(f"Saved vector database to {version_path} and pointed {DB_FAISS_PATH} at it")
+    report(1.0, f"Published {os.path.basename(version_path)}")
+    return version_path
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Build Asha's vector database from the configured URLs")
+    parser.add_argument("--keep-unfetched", action="store_true",
+                        help="Keep the previous chunks of URLs that fail to fetch and report what changed; "
+                             "every build still fetches and re-indexes everything (embeddings come from the cache)")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                        help="FAISS index structure; approximate types trade a little recall for speed and memory")
+    parser.add_argument("--nlist", type=int, help="IVF lists (default ~4*sqrt(n))")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="IVF lists probed per query")
+    parser.add_argument("--pq-m", type=int, default=DEFAULT_PQ_M, help="IVF-PQ sub-quantizers (bytes per vector)")
+    parser.add_argument("--hnsw-m", type=int, default=DEFAULT_HNSW_M, help="HNSW neighbours per node")
+    parser.add_argument("--ef-search", type=int, default=DEFAULT_EF_SEARCH, help="HNSW candidate list size at query time")
+    parser.add_argument("--rescore-factor", type=int,
+                        help=f"Candidates rescored per result (default {DEFAULT_RESCORE_FACTORS['sq8']} for sq8, "
+                             f"{DEFAULT_RESCORE_FACTORS['binary']} for binary)")
+    args = parser.parse_args()
+    main(keep_unfetched=args.keep_unfetched, index_type=args.index_type, ann_params={
+        "nlist": args.nlist,
+        "nprobe": args.nprobe,
+        "pq_m": args.pq_m,
+        "hnsw_m": args.hnsw_m,
+        "ef_search": args.ef_search,
+        "rescore_factor": args.rescore_factor,
+    })
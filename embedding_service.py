@@ -0,0 +1,382 @@
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Constants
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_DIR = "vectorstore/embedding_cache"
+BATCH_SIZE = 64
+QUERY_MAX_BATCH = 32
+QUERY_MAX_WAIT = 0.005  # seconds a query waits for concurrent ones to share its model call
+QUERY_LRU_SIZE = 1024
+KEY_LENGTH = 40  # sha1 hex digest; fixed width, so the row count follows from the size of keys.txt
+QUERY_ENCODERS = ("torch", "int8", "onnx")
+QUERY_ENCODER = os.environ.get("ASHA_QUERY_ENCODER", "torch")
+# Quantized export shipped in the model repo; pick the file matching the CPU (avx2, avx512, arm64)
+ONNX_MODEL_FILE = os.environ.get("ASHA_ONNX_MODEL_FILE", "onnx/model_quint8_avx2.onnx")
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent text-hash -> vector cache.
+
+    Vectors are appended to a raw float32 file that is read back through a
+    read-only memory map; keys.txt holds one fixed-width text hash per row in
+    the same order. Appends take an exclusive file lock so the index build and
+    the chat app can share one cache directory.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.keys_path = os.path.join(cache_dir, "keys.txt")
+        self.meta_path = os.path.join(cache_dir, "meta.json")
+        self.lock = threading.Lock()
+        self.index = {}
+        self.dim = None
+        self.vectors = None
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.meta_path, 'r') as f:
+                self.dim = json.load(f)["dim"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return
+        with self._locked():
+            rows = self._align()
+        with open(self.keys_path, 'r') as f:
+            for row in range(rows):
+                self.index[f.readline().strip()] = row
+
+    @contextmanager
+    def _locked(self):
+        """Open both cache files for appending under the exclusive file lock"""
+        with open(self.vectors_path, 'ab') as vectors_file, open(self.keys_path, 'a') as keys_file:
+            if fcntl:
+                fcntl.flock(vectors_file, fcntl.LOCK_EX)
+            try:
+                yield vectors_file, keys_file
+            finally:
+                if fcntl:
+                    fcntl.flock(vectors_file, fcntl.LOCK_UN)
+
+    def _align(self):
+        """Cut both files back to the rows that have both a vector and a key (file lock held).
+
+        An interrupted append can leave vector rows without keys or a partial
+        key line; dropping them keeps row n of vectors.f32 and line n of
+        keys.txt together, and the returned row count is where the next
+        append starts.
+        """
+        key_bytes = KEY_LENGTH + 1
+        row_bytes = self.dim * 4
+        rows = min(os.path.getsize(self.keys_path) // key_bytes, os.path.getsize(self.vectors_path) // row_bytes)
+        for path, size in ((self.keys_path, rows * key_bytes), (self.vectors_path, rows * row_bytes)):
+            if os.path.getsize(path) > size:
+                print(f"Embedding cache: dropping an interrupted append from {path}")
+                os.truncate(path, size)
+        return rows
+
+    def _row_count(self):
+        if not self.dim or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * 4)
+
+    def _matrix(self):
+        """Memory map of all vector rows, reopened after appends"""
+        if self.vectors is None:
+            rows = self._row_count()
+            if rows == 0:
+                return None
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+        return self.vectors
+
+    def get_many(self, hashes):
+        """Return {hash: vector} for the hashes that are cached"""
+        with self.lock:
+            matrix = self._matrix()
+            if matrix is None:
+                return {}
+            return {h: np.array(matrix[self.index[h]]) for h in hashes if h in self.index}
+
+    def put_many(self, hashes, vectors):
+        """Append vectors for the given hashes"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if any(len(h) != KEY_LENGTH for h in hashes):
+            raise ValueError(f"Cache keys must be {KEY_LENGTH}-character text hashes")
+        with self.lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, 'w') as f:
+                    json.dump({"dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cache dimension {self.dim}")
+
+            with self._locked() as (vectors_file, keys_file):
+                # Row numbers come from the aligned files, not from our own view of them:
+                # another process may have appended since we loaded
+                start_row = self._align()
+                vectors_file.write(vectors.tobytes())
+                vectors_file.flush()
+                keys_file.write("".join(f"{h}\n" for h in hashes))
+                keys_file.flush()
+            for offset, h in enumerate(hashes):
+                self.index[h] = start_row + offset
+            self.vectors = None
+
+    def __len__(self):
+        return len(self.index)
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings backed by the on-disk cache, loading the model only when needed"""
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, cache_dir=EMBEDDING_CACHE_DIR, batch_size=BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = EmbeddingCache(os.path.join(cache_dir, model_name.replace("/", "__")))
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from langchain_huggingface import HuggingFaceEmbeddings
+                    self._model = HuggingFaceEmbeddings(
+                        model_name=self.model_name,
+                        encode_kwargs={"batch_size": self.batch_size},
+                    )
+        return self._model
+
+    def embed_vectors(self, texts):
+        """Embed texts as a float32 array, encoding only texts not seen before"""
+        hashes = [text_hash(text) for text in texts]
+        found = self.cache.get_many(set(hashes))
+
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in found:
+                missing.setdefault(h, text)
+        self.cache_hits += len(texts) - len(missing)
+        self.cache_misses += len(missing)
+
+        missing_hashes = list(missing)
+        for start in range(0, len(missing_hashes), self.batch_size):
+            batch_hashes = missing_hashes[start:start + self.batch_size]
+            batch = np.asarray(self.model.embed_documents([missing[h] for h in batch_hashes]), dtype=np.float32)
+            self.cache.put_many(batch_hashes, batch)
+            found.update(zip(batch_hashes, batch))
+
+        if not texts:
+            return np.zeros((0, self.cache.dim or 0), dtype=np.float32)
+        return np.vstack([found[h] for h in hashes])
+
+    def embed_documents(self, texts):
+        return self.embed_vectors(texts).tolist()
+
+    def embed_query(self, text):
+        return self.embed_vectors([text])[0].tolist()
+
+
+class QuantizedQueryEncoder:
+    """Faster CPU encoder for queries: int8 dynamic quantization of the model, or an ONNX Runtime export.
+
+    Only queries go through it; document vectors keep coming from the
+    full-precision model, and the small asymmetry costs little recall (see
+    benchmarks/ann_recall.py --query-encoder). Falls back to the
+    full-precision model if the encoder cannot be loaded, e.g. when
+    onnxruntime/optimum are not installed.
+    """
+    def __init__(self, kind, fallback, model_name=EMBEDDING_MODEL_NAME, onnx_file=ONNX_MODEL_FILE,
+                 batch_size=QUERY_MAX_BATCH):
+        if kind not in QUERY_ENCODERS:
+            raise ValueError(f"Unknown query encoder: {kind}")
+        self.kind = kind
+        self.fallback = fallback
+        self.model_name = model_name
+        self.onnx_file = onnx_file
+        self.batch_size = batch_size
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+        if self.kind == "onnx":
+            return SentenceTransformer(self.model_name, device="cpu", backend="onnx",
+                                       model_kwargs={"file_name": self.onnx_file})
+        model = SentenceTransformer(self.model_name, device="cpu")
+        if self.kind == "int8":
+            import torch
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    try:
+                        self._model = self._load()
+                    except Exception as e:
+                        print(f"Could not load the {self.kind} query encoder ({type(e).__name__}: {e}); "
+                              f"using the full-precision model")
+                        self._model = False
+        return self._model
+
+    def embed_documents(self, texts):
+        if self.model is False:
+            # The fallback's own model, not its persistent cache, which is meant for documents
+            return getattr(self.fallback, "model", self.fallback).embed_documents(texts)
+        return self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+
+
+class QueryEmbedder(Embeddings):
+    """Front-end for query embeddings: a bounded LRU plus time-windowed micro-batches.
+
+    Repeated and follow-up queries (the semantic cache lookup and the
+    retriever embed the same text) are answered from memory. Other
+    embed_query calls from concurrent threads that arrive within max_wait of
+    each other are encoded in one model call by a background worker. Query
+    vectors stay in memory; document embeddings still go through the
+    persistent cache of the wrapped model. An encoder, if given, encodes
+    the queries instead of the wrapped model.
+    """
+    def __init__(self, embeddings, max_batch=QUERY_MAX_BATCH, max_wait=QUERY_MAX_WAIT, lru_size=QUERY_LRU_SIZE,
+                 encoder=None):
+        self.embeddings = embeddings
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.lru_size = lru_size
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.worker = None
+        self.lru_hits = 0
+        self.lru_misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+
+    def _encode(self, texts):
+        # Bypass the persistent cache, which is meant for documents, not every query ever asked
+        model = self.encoder or getattr(self.embeddings, "model", self.embeddings)
+        vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+        with self.lock:
+            self.batches += 1
+            self.batched_queries += len(texts)
+            for text, vector in zip(texts, vectors):
+                self.lru[text] = vector
+                self.lru.move_to_end(text)
+            while len(self.lru) > self.lru_size:
+                self.lru.popitem(last=False)
+        return vectors
+
+    def _cached(self, texts):
+        """{text: vector} for texts in the LRU"""
+        found = {}
+        with self.lock:
+            for text in texts:
+                vector = self.lru.get(text)
+                if vector is not None:
+                    self.lru.move_to_end(text)
+                    found[text] = vector
+            self.lru_hits += len(found)
+            self.lru_misses += len(texts) - len(found)
+        return found
+
+    def _run_worker(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self._encode(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+    def embed_queries(self, texts):
+        """Embed a batch of queries in the caller's thread, as a float32 array"""
+        found = self._cached(texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in found))
+        if missing:
+            found.update(zip(missing, self._encode(missing)))
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([found[text] for text in texts])
+
+    def embed_uncached(self, text):
+        """Encode a query with the model even if it is in the LRU (then refreshed), e.g. to time the model"""
+        return self._encode([text])[0].tolist()
+
+    def embed_query(self, text):
+        vector = self._cached([text]).get(text)
+        if vector is None:
+            with self.lock:
+                if self.worker is None:
+                    self.worker = threading.Thread(target=self._run_worker, name="query-embedder", daemon=True)
+                    self.worker.start()
+            future = Future()
+            self.queue.put((text, future))
+            vector = future.result()
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+_query_embedder = None
+
+def get_embedding_model():
+    """Shared, cache-backed embedding model for building the vectorstore"""
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            _embedding_model = CachedEmbeddings()
+        return _embedding_model
+
+def get_query_embedder():
+    """Shared query front-end over the embedding model; give this to vectorstores that serve queries"""
+    global _query_embedder
+    model = get_embedding_model()
+    with _embedding_model_lock:
+        if _query_embedder is None:
+            encoder = None
+            if QUERY_ENCODER != "torch":
+                encoder = QuantizedQueryEncoder(QUERY_ENCODER, model)
+            _query_embedder = QueryEmbedder(model, encoder=encoder)
+        return _query_embedder
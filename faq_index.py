@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from langchain_core.documents import Document
+from conversation_memory import STOPWORDS, WORD_PATTERN
+
+# Constants
+FAQ_INDEX_FILE = "vectorstore/faq_index.json"  # outside the versioned index directories, so it outlives rebuilds
+FAQ_INDEX_VERSION = 2
+KEY_STOPWORDS = STOPWORDS - {"no", "not"}  # a negation changes the answer
+
+
+def faq_key(query):
+    """Lookup key of a query: its content words, lowercased, deduplicated and sorted.
+
+    "What are some remote jobs for women?" and "remote jobs for women" share
+    a key, so near-exact repeats of a frequent query hit the same entry.
+    """
+    words = {word.strip(".-'") for word in WORD_PATTERN.findall(query.lower())}
+    return " ".join(sorted(word for word in words if word and word not in KEY_STOPWORDS))
+
+
+def prompt_id(prompt_template):
+    """Short id of the prompt template an answer was generated with"""
+    return hashlib.sha1(prompt_template.encode('utf-8')).hexdigest()[:12]
+
+
+def entry_key(prompt_template_id, key):
+    """Key of an entry in the index file; the same query gets one answer per prompt template"""
+    return f"{prompt_template_id}:{key}"
+
+
+def source_chunk_ids(source_documents):
+    """Chunk ids behind the retrieved documents, including every chunk of a merged passage"""
+    chunk_ids = []
+    for doc in source_documents:
+        for chunk_id in doc.metadata.get("chunk_ids") or [doc.metadata.get("chunk_id")]:
+            if chunk_id and chunk_id not in chunk_ids:
+                chunk_ids.append(chunk_id)
+    return chunk_ids
+
+
+class FaqIndex:
+    """Precomputed answers for the most frequent queries, looked up by faq_key.
+
+    Answers are only served with the prompt template they were generated
+    with: the Streamlit app and the API/CLI word answers differently, so
+    each entry records its prompt_id and each FaqIndex serves one template.
+    Every entry records the chunk ids its answer was built from, and chunk ids
+    are content hashes. Bound to a vectorstore, only entries whose chunks all
+    still exist in it are served, so a rebuild that changes any source chunk
+    retires the answer without the file being touched. A hit is one dict
+    lookup: no embedding, no search, no LLM call.
+    """
+    def __init__(self, prompt_template, path=FAQ_INDEX_FILE):
+        self.prompt_id = prompt_id(prompt_template)
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.file_stamp = None
+        self.vectorstore = None
+        self.table = {}  # faq_key -> servable entry for self.vectorstore and self.prompt_id
+        self.hits = 0
+        self.misses = 0
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _bind(self, vectorstore):
+        """Reload the file if the job rewrote it and keep the entries still backed by vectorstore (lock held)"""
+        stamp = self._stamp()
+        if stamp == self.file_stamp and vectorstore is self.vectorstore:
+            return
+        if stamp != self.file_stamp:
+            self.entries = load_faq_entries(self.path)
+            self.file_stamp = stamp
+        self.vectorstore = vectorstore
+        self.table = {}
+        entries = [entry for entry in self.entries.values() if entry["prompt_id"] == self.prompt_id]
+        for entry in entries:
+            documents = [vectorstore.docstore.search(chunk_id) for chunk_id in entry["chunk_ids"]]
+            if documents and all(isinstance(doc, Document) for doc in documents):
+                self.table[entry["key"]] = {"query": entry["query"], "answer": entry["answer"],
+                                            "source_documents": documents}
+        if entries:
+            print(f"FAQ index: {len(self.table)} of {len(entries)} answers match the served index")
+
+    def current(self, vectorstore):
+        """Servable entries by faq_key for the given vectorstore"""
+        with self.lock:
+            self._bind(vectorstore)
+            return dict(self.table)
+
+    def lookup(self, query, vectorstore):
+        """The precomputed answer and source documents for the query, or None"""
+        key = faq_key(query)
+        with self.lock:
+            self._bind(vectorstore)
+            entry = self.table.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+
+def load_faq_entries(path=FAQ_INDEX_FILE):
+    """All entries of the FAQ index file, for every prompt template"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if data.get("version") != FAQ_INDEX_VERSION:
+        return {}
+    return data.get("entries", {})
+
+
+def write_faq_index(entries, path=FAQ_INDEX_FILE):
+    """Atomically replace the FAQ index file; serving processes pick it up on their next lookup"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": FAQ_INDEX_VERSION, "built_at": time.time(), "entries": entries}, f, indent=1)
+    os.replace(temp_path, path)
@@ -0,0 +1,105 @@
+import os
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup
+import soupsieve
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Constants
+# Equivalent to the selector 'script, style, nav, footer, header, [class*="ads"], [id*="ads"]'
+JUNK_TAGS = frozenset(["script", "style", "nav", "footer", "header"])
+JUNK_ATTRIBUTE_SUBSTRING = "ads"
+FALLBACK_SELECTOR = 'main, article, .content, #content, .post, .article'
+EXTRACT_PROCESSES = max(0, (os.cpu_count() or 1) - 1)  # below 2, extraction runs in-process
+
+_compiled = {}
+
+
+def compile_selector(selector):
+    """Compile a CSS selector once per process"""
+    pattern = _compiled.get(selector)
+    if pattern is None:
+        pattern = _compiled[selector] = soupsieve.compile(selector)
+    return pattern
+
+
+def precompile_selectors(urls_file="data/urls.json"):
+    """Compile the shared selectors and every per-URL (and combined) selector listed in urls.json"""
+    compile_selector(FALLBACK_SELECTOR)
+    try:
+        with open(urls_file, 'r') as f:
+            urls_data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return
+    for url_info in urls_data:
+        selectors = url_info.get("selectors") or []
+        for selector in selectors:
+            compile_selector(selector)
+        compile_selector(', '.join(selectors + [FALLBACK_SELECTOR]))
+
+
+def is_junk(tag):
+    """Plain-Python match of the junk selector; far cheaper than the CSS attribute-substring match"""
+    if tag.name in JUNK_TAGS:
+        return True
+    classes = tag.attrs.get("class")
+    if classes:
+        joined = classes if isinstance(classes, str) else " ".join(classes)
+        if JUNK_ATTRIBUTE_SUBSTRING in joined:
+            return True
+    element_id = tag.attrs.get("id")
+    return element_id is not None and JUNK_ATTRIBUTE_SUBSTRING in element_id
+
+
+def extract_text(html, content_selectors=None, parser=HTML_PARSER):
+    """Extract meaningful text content, the same text the original html.parser version produced.
+
+    Junk is found in one pass without the CSS engine. The content selectors
+    and the fallback selector are matched in one combined tree walk, then
+    split per selector in document order.
+    """
+    soup = BeautifulSoup(html, parser)
+
+    # Remove junk
+    for element in soup.find_all(is_junk):
+        element.decompose()
+
+    selectors = list(content_selectors or []) + [FALLBACK_SELECTOR]
+    candidates = compile_selector(', '.join(selectors)).select(soup)
+
+    if content_selectors:
+        extracted_content = []
+        for selector in content_selectors:
+            pattern = compile_selector(selector)
+            for element in candidates:
+                if pattern.match(element):
+                    extracted_content.append(element.get_text(strip=True, separator=' '))
+        if extracted_content:
+            return ' '.join(extracted_content)
+
+    # Default fallback
+    fallback = compile_selector(FALLBACK_SELECTOR)
+    main_content = [element for element in candidates if fallback.match(element)]
+    if main_content:
+        return ' '.join([el.get_text(strip=True, separator=' ') for el in main_content])
+
+    body = soup.find('body')
+    return body.get_text(strip=True, separator=' ') if body else ''
+
+
+def create_extraction_pool(max_workers=EXTRACT_PROCESSES, urls_file="data/urls.json"):
+    """Process pool whose workers have the configured selectors precompiled, or None to extract in-process.
+
+    One worker process would only add pickling overhead. Workers are spawned,
+    not forked: a refresh runs inside the multithreaded Streamlit process.
+    """
+    if max_workers < 2:
+        return None
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=precompile_selectors, initargs=(urls_file,))
@@ -0,0 +1,185 @@
+import os
+import re
+import json
+import math
+from collections import Counter, defaultdict
+from typing import Any, List, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from context_packing import PackedRetriever
+from partition_index import PartitionIndex, QueryRouter
+from reranker import RerankRetriever
+import tracing
+
+# Constants
+BM25_FILE = "bm25.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+FETCH_K = 20
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Sparse inverted index scored with Okapi BM25.
+
+    Postings are partitioned by the chunk's `type` metadata, so a search
+    restricted to some types never touches postings of the other types.
+    """
+    def __init__(self, doc_ids=None, doc_lengths=None, postings=None):
+        self.doc_ids = doc_ids or []
+        self.doc_lengths = doc_lengths or []
+        self.postings = postings or {}  # term -> {type: [[doc_index, tf], ...]}
+        self.refresh_stats()
+
+    def refresh_stats(self):
+        """Recompute the average length and document frequencies; call after add()"""
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        self.doc_freq = {
+            term: sum(len(entries) for entries in by_type.values())
+            for term, by_type in self.postings.items()
+        }
+
+    def add(self, doc_id, doc):
+        """Append one chunk's postings"""
+        doc_index = len(self.doc_ids)
+        terms = Counter(tokenize(doc.page_content + " " + doc.metadata.get("title", "")))
+        doc_type = doc.metadata.get("type", "general")
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {}).setdefault(doc_type, []).append([doc_index, tf])
+
+    def search(self, query, k=FETCH_K, types=None):
+        """Return up to k (doc_id, score) pairs, optionally only for the given types"""
+        total = len(self.doc_ids)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            by_type = self.postings.get(term)
+            if not by_type:
+                continue
+            df = self.doc_freq[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for doc_type, entries in by_type.items():
+                if types is not None and doc_type not in types:
+                    continue
+                for doc_index, tf in entries:
+                    length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_index] / self.avg_length
+                    scores[doc_index] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.doc_ids[doc_index], score) for doc_index, score in best]
+
+    def save(self, db_path):
+        with open(os.path.join(db_path, BM25_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"doc_ids": self.doc_ids, "doc_lengths": self.doc_lengths, "postings": self.postings}, f)
+
+    @classmethod
+    def load(cls, db_path):
+        """Load the index saved next to the FAISS files, or None if there is none"""
+        try:
+            with open(os.path.join(db_path, BM25_FILE), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return cls(data["doc_ids"], data["doc_lengths"], data["postings"])
+
+
+def document_key(doc):
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses FAISS and BM25 rankings with reciprocal rank fusion.
+
+    With a router, queries it can place (e.g. "remote jobs") search only the
+    matching per-type or per-source partitions, falling back to the whole
+    index when those hold fewer than k chunks.
+    """
+    vectorstore: Any
+    bm25: Any
+    k: int = 5
+    fetch_k: int = FETCH_K
+    rrf_k: int = RRF_K
+    types: Optional[List[str]] = None
+    partitions: Any = None
+    router: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with tracing.span("embed_query"):
+            query_vector = self.vectorstore.embeddings.embed_query(query)
+        return self.search_by_vector(query, query_vector)
+
+    def search_by_vector(self, query, query_vector):
+        """Hybrid search with an already computed query embedding"""
+        types = self.types
+        sources = None
+        dense = None
+        route = self.router.route(query, query_vector) if self.router is not None and types is None else None
+        if route is not None:
+            with tracing.span("partition_search", k=self.fetch_k, types=",".join(route.types)) as partition_span:
+                hits = self.partitions.search(query_vector, route, self.fetch_k)
+                partition_span.set(hits=len(hits))
+            if len(hits) >= self.k:
+                dense = [self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[position])
+                         for position, _ in hits]
+                types = route.types
+                sources = set(route.sources) if route.sources else None
+
+        if dense is None:
+            search_filter = None
+            if types is not None:
+                allowed = set(types)
+                search_filter = lambda metadata: metadata.get("type") in allowed
+            with tracing.span("faiss_search", k=self.fetch_k):
+                dense = self.vectorstore.similarity_search_by_vector(
+                    query_vector, k=self.fetch_k, filter=search_filter, fetch_k=self.fetch_k * 4
+                )
+        with tracing.span("bm25_search", k=self.fetch_k):
+            sparse = self.bm25.search(query, k=self.fetch_k, types=types)
+
+        fused = defaultdict(float)
+        documents = {}
+        for rank, doc in enumerate(dense):
+            key = document_key(doc)
+            documents[key] = doc
+            fused[key] += 1.0 / (self.rrf_k + rank + 1)
+        for rank, (doc_id, _) in enumerate(sparse):
+            doc = self.vectorstore.docstore.search(doc_id)
+            if not isinstance(doc, Document) or (sources is not None and doc.metadata.get("source") not in sources):
+                continue
+            key = document_key(doc)
+            documents.setdefault(key, doc)
+            fused[key] += 1.0 / (self.rrf_k + rank + 1)
+
+        ranked = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return [documents[key] for key in ranked]
+
+
+def retrieve_by_vector(retriever, query, query_vector):
+    """Run a retriever made by build_retriever (optionally reranked and packed) with an already computed query embedding"""
+    if isinstance(retriever, PackedRetriever):
+        return retriever.pack(retrieve_by_vector(retriever.retriever, query, query_vector))
+    if isinstance(retriever, RerankRetriever):
+        return retriever.rerank(query, retrieve_by_vector(retriever.retriever, query, query_vector))
+    if isinstance(retriever, HybridRetriever):
+        return retriever.search_by_vector(query, query_vector)
+    return retriever.vectorstore.similarity_search_by_vector(query_vector, **retriever.search_kwargs)
+
+
+def build_retriever(vectorstore, k, db_path, types=None):
+    """Hybrid retriever when a BM25 index was built with the vectorstore, plain FAISS otherwise.
+
+    Builds that wrote partitions also get a query router.
+    """
+    bm25 = BM25Index.load(db_path)
+    if bm25 is None:
+        return vectorstore.as_retriever(search_kwargs={'k': k})
+    partitions = PartitionIndex.load(db_path)
+    router = QueryRouter(partitions) if partitions is not None else None
+    return HybridRetriever(vectorstore=vectorstore, bm25=bm25, k=k, types=types, partitions=partitions, router=router)
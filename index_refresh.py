@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+import traceback
+import create_memory_for_asha
+from embedding_service import get_query_embedder
+from vector_storage import load_vectorstore
+import tracing
+
+# Constants
+DB_FAISS_PATH = "vectorstore/db_faiss"
+
+
+class ServedIndex:
+    """The index version currently answering queries, swappable while chats are running.
+
+    `current` is replaced as a whole (one reference assignment), so a turn that
+    read it keeps a consistent vectorstore and chain even if a reload lands
+    mid-answer; the old version stays on disk until the build script prunes it.
+    """
+    def __init__(self, build_chain, db_path=DB_FAISS_PATH):
+        self.build_chain = build_chain
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.current = self._load()
+
+    def _load(self):
+        # Resolve the symlink once so the vectorstore, BM25 index and chain all come from the same version
+        version_path = os.path.realpath(self.db_path)
+        with tracing.span("load_vectorstore", version=os.path.basename(version_path)):
+            vectorstore = load_vectorstore(version_path, get_query_embedder())
+        return {
+            "path": version_path,
+            "vectorstore": vectorstore,
+            "qa_chain": self.build_chain(vectorstore, version_path),
+            "loaded_at": time.time(),
+        }
+
+    def reload(self):
+        """Load whatever db_path points at now and start serving it"""
+        with self.lock:
+            if os.path.realpath(self.db_path) == self.current["path"]:
+                return False
+            self.current = self._load()
+        print(f"Now serving {self.current['path']}")
+        return True
+
+
+class RefreshJob:
+    """Rebuilds the knowledge base on a background thread, then hot-swaps the index.
+
+    The rebuild runs with keep_unfetched=True, so URLs that fail to fetch keep
+    their previous chunks instead of disappearing from the served index.
+    """
+    def __init__(self, served):
+        self.served = served
+        self.lock = threading.Lock()
+        self.thread = None
+        self.status = {"state": "idle", "fraction": 0.0, "message": "", "started": None, "finished": None,
+                       "error": None}
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Start a refresh; returns False if one is already running"""
+        with self.lock:
+            if self.running:
+                return False
+            self.status = {"state": "running", "fraction": 0.0, "message": "Starting", "started": time.time(),
+                           "finished": None, "error": None}
+            self.thread = threading.Thread(target=self._run, name="kb-refresh", daemon=True)
+            self.thread.start()
+        return True
+
+    def _progress(self, fraction, message):
+        self.status = dict(self.status, fraction=fraction, message=message)
+
+    def _run(self):
+        try:
+            version_path = create_memory_for_asha.main(keep_unfetched=True, progress=self._progress)
+            if version_path is None:
+                message = "Nothing was crawled; still serving the previous knowledge base"
+            else:
+                self._progress(1.0, "Loading the new index")
+                self.served.reload()
+                message = f"Serving {os.path.basename(version_path)}"
+            self.status = dict(self.status, state="done", fraction=1.0, message=message, finished=time.time())
+        except Exception as e:
+            traceback.print_exc()
+            self.status = dict(self.status, state="failed", message="Refresh failed; still serving the previous "
+                               "knowledge base", error=f"{type(e).__name__}: {e}", finished=time.time())
@@ -0,0 +1,208 @@
+import time
+import queue
+import threading
+
+# Constants
+PAGE_QUEUE_SIZE = 8  # extracted pages waiting to be split
+CHUNK_QUEUE_SIZE = 512  # chunks waiting to be embedded
+BATCH_QUEUE_SIZE = 4  # embedded batches waiting to be indexed
+EMBED_BATCH_SIZE = 64
+PROGRESS_INTERVAL = 5.0  # seconds
+
+_DONE = object()
+
+
+class _Aborted(Exception):
+    """Raised inside a stage when another stage has failed"""
+
+
+class StageStats:
+    """Item count, busy time and throughput of one pipeline stage"""
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy_s = 0.0
+        self.started = None
+        self.finished = None
+
+    def record(self, items, seconds):
+        self.items += items
+        self.busy_s += seconds
+
+    @property
+    def elapsed_s(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self):
+        return self.items / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def busy_fraction(self):
+        return self.busy_s / self.elapsed_s if self.elapsed_s else 0.0
+
+
+class IngestPipeline:
+    """Streams documents through split -> embed (in fixed-size batches) -> index.
+
+    Fetching and extraction happen inside the `documents` iterator; it, the
+    splitter and the embedder each run on their own thread, and the sink runs
+    on the calling thread. The stages are connected by bounded queues, so a
+    slow stage makes the ones before it wait instead of piling up pages,
+    chunks or vectors in memory. on_progress, if given, is called with the
+    stage stats from the calling thread at least every half second.
+    """
+    def __init__(self, documents, split, embed, sink, batch_size=EMBED_BATCH_SIZE,
+                 progress_interval=PROGRESS_INTERVAL, on_progress=None):
+        self.documents = documents
+        self.split = split
+        self.embed = embed
+        self.sink = sink
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.on_progress = on_progress
+        self.pages = queue.Queue(PAGE_QUEUE_SIZE)
+        self.chunks = queue.Queue(CHUNK_QUEUE_SIZE)
+        self.batches = queue.Queue(BATCH_QUEUE_SIZE)
+        self.stats = {
+            name: StageStats(name, unit)
+            for name, unit in (("extract", "pages"), ("split", "chunks"), ("embed", "chunks"), ("index", "chunks"))
+        }
+        self.failed = threading.Event()
+        self.errors = []
+
+    def _put(self, target, item):
+        """Block until there is room, giving up if another stage failed"""
+        while True:
+            if self.failed.is_set():
+                raise _Aborted()
+            try:
+                target.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, source):
+        while True:
+            if self.failed.is_set():
+                raise _Aborted()
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _run_stage(self, name, work, output):
+        stats = self.stats[name]
+        stats.started = time.perf_counter()
+        try:
+            work(stats)
+            self._put(output, _DONE)
+        except _Aborted:
+            pass
+        except Exception as e:
+            self.errors.append(e)
+            self.failed.set()
+        finally:
+            stats.finished = time.perf_counter()
+
+    def _extract(self, stats):
+        documents = iter(self.documents)
+        try:
+            while True:
+                start = time.perf_counter()
+                document = next(documents, _DONE)
+                if document is _DONE:
+                    return
+                stats.record(1, time.perf_counter() - start)
+                self._put(self.pages, document)
+        finally:
+            # Stops the crawl early if a later stage failed
+            close = getattr(documents, "close", None)
+            if close is not None:
+                close()
+
+    def _split(self, stats):
+        while True:
+            document = self._get(self.pages)
+            if document is _DONE:
+                return
+            start = time.perf_counter()
+            chunks = self.split(document)
+            stats.record(len(chunks), time.perf_counter() - start)
+            for chunk in chunks:
+                self._put(self.chunks, chunk)
+
+    def _embed(self, stats):
+        batch = []
+        while True:
+            chunk = self._get(self.chunks)
+            if chunk is not _DONE:
+                batch.append(chunk)
+            if batch and (chunk is _DONE or len(batch) >= self.batch_size):
+                start = time.perf_counter()
+                vectors = self.embed([item.page_content for item in batch])
+                stats.record(len(batch), time.perf_counter() - start)
+                self._put(self.batches, (batch, vectors))
+                batch = []
+            if chunk is _DONE:
+                return
+
+    def run(self):
+        """Run every stage to completion and return the per-stage stats"""
+        threads = [
+            threading.Thread(target=self._run_stage, args=(name, work, output), name=f"ingest-{name}", daemon=True)
+            for name, work, output in (
+                ("extract", self._extract, self.pages),
+                ("split", self._split, self.chunks),
+                ("embed", self._embed, self.batches),
+            )
+        ]
+        for thread in threads:
+            thread.start()
+
+        stats = self.stats["index"]
+        stats.started = last_progress = time.perf_counter()
+        try:
+            while not self.failed.is_set():
+                try:
+                    item = self.batches.get(timeout=0.5)
+                except queue.Empty:
+                    item = None
+                if item is _DONE:
+                    break
+                if item is not None:
+                    chunks, vectors = item
+                    start = time.perf_counter()
+                    self.sink(chunks, vectors)
+                    stats.record(len(chunks), time.perf_counter() - start)
+                if self.on_progress is not None:
+                    self.on_progress(self.stats)
+                if self.progress_interval and time.perf_counter() - last_progress >= self.progress_interval:
+                    self.print_progress()
+                    last_progress = time.perf_counter()
+        except BaseException:
+            self.failed.set()
+            raise
+        finally:
+            stats.finished = time.perf_counter()
+            for thread in threads:
+                thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+        return self.stats
+
+    def print_progress(self):
+        """One line with every stage's count and rate, plus the queue depths"""
+        stages = ", ".join(f"{s.name} {s.items} {s.unit} ({s.rate:.1f}/s)" for s in self.stats.values())
+        print(f"Progress: {stages}; queued {self.pages.qsize()} pages, {self.chunks.qsize()} chunks, "
+              f"{self.batches.qsize()} batches")
+
+    def print_report(self):
+        """Per-stage totals; the stage with the highest busy share is the bottleneck"""
+        print(f"{'stage':>8} {'items':>8} {'unit':<7} {'rate/s':>8} {'busy':>6}")
+        for s in self.stats.values():
+            print(f"{s.name:>8} {s.items:8d} {s.unit:<7} {s.rate:8.1f} {s.busy_fraction:6.0%}")
@@ -0,0 +1,194 @@
+import os
+import re
+import json
+from collections import namedtuple
+import numpy as np
+import faiss
+from ann_index import build_ann_index, quantized_type
+
+# Constants
+PARTITIONS_FILE = "partitions.json"
+PARTITIONS_DIR = "partitions"
+PARTITIONS_VERSION = 2
+CENTROID_MARGIN = 0.1  # cosine lead the closest type centroid needs before a query is routed by embedding alone
+NAMED_SOURCE_TYPES = frozenset(["company"])  # sources a query can be routed to by name
+TITLE_NAME_SEPARATOR = re.compile(r"\s+[–|-]\s+")  # "JSW – Opportunities for Women" names the source "JSW"
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+
+# Query words that point at a chunk `type`; a job-flavoured type also searches the general job listings
+TYPE_KEYWORDS = {
+    "remote": ["remote", "work from home", "wfh", "home based", "home-based", "telecommute"],
+    "part-time": ["part-time", "part time", "parttime", "flexible", "few hours"],
+    "entry-level": ["fresher", "freshers", "entry level", "entry-level", "graduate", "graduates", "intern",
+                    "internship", "beginner", "first job"],
+    "location": ["pune", "mumbai", "navi mumbai", "bangalore", "bengaluru", "hyderabad", "secunderabad", "city",
+                 "near me"],
+    "company": ["company", "companies", "employer", "employers"],
+    "jobs": ["job", "jobs", "opening", "openings", "vacancy", "vacancies", "hiring", "role", "roles",
+             "position", "positions"],
+}
+JOB_TYPES = frozenset(["remote", "part-time", "entry-level", "location", "company"])
+# Types no keyword points at ("general", "homepage", ...) hold the broad advice; routed searches always include
+# them, so a common word like "role" or "flexible" narrows the search without cutting that content out
+KEYWORD_TYPES = frozenset(TYPE_KEYWORDS)
+
+Route = namedtuple("Route", ["types", "sources"])
+
+
+def normalize_words(text):
+    return " " + " ".join(re.findall(r"[\w-]+", text.lower())) + " "
+
+
+def source_name(title):
+    """Name a source can be asked about by, taken from a "<name> – <description>" title"""
+    parts = TITLE_NAME_SEPARATOR.split(title or "", 1)
+    return parts[0].strip() if len(parts) == 2 else None
+
+
+class PartitionBuilder:
+    """Records each chunk's type and source while the index is built, then writes per-type flat indexes.
+
+    Inside a type's index the vectors are grouped by source, so a source's
+    chunks of that type are one contiguous slice of it. A source whose chunks
+    have several types gets one (start, count) slice per type.
+    """
+    def __init__(self):
+        self.types = {}  # type -> [global positions]
+        self.sources = {}  # source -> {"title", "positions"}
+
+    def add(self, start, chunks):
+        for offset, chunk in enumerate(chunks):
+            doc_type = chunk.metadata.get("type", "general")
+            source = chunk.metadata.get("source", "")
+            self.types.setdefault(doc_type, []).append(start + offset)
+            entry = self.sources.setdefault(source, {"title": chunk.metadata.get("title", ""), "positions": []})
+            entry["positions"].append(start + offset)
+
+    def save(self, db_path, index, served_index=None):
+        """Write one index per type plus partitions.json; index is the builder's flat index.
+
+        Partitions are flat, or quantized the same way as served_index when that is sq8/binary.
+        """
+        if index is None or not self.types:
+            return
+        vectors = index.reconstruct_n(0, index.ntotal)
+        os.makedirs(os.path.join(db_path, PARTITIONS_DIR), exist_ok=True)
+        source_of = {position: source for source, entry in self.sources.items() for position in entry["positions"]}
+        compact = quantized_type(served_index) if served_index is not None else None
+        types = {}
+        sources = {source: {"name": source_name(entry["title"]), "slices": {}}  # slices: type -> [start, count]
+                   for source, entry in self.sources.items()}
+        for doc_type, positions in self.types.items():
+            # Group by source, keeping build order within a source
+            positions = sorted(positions, key=lambda position: (source_of[position], position))
+            if compact:
+                partition = build_ann_index(vectors[positions], compact, rescore_factor=served_index.k_factor)
+            else:
+                partition = faiss.IndexFlatL2(vectors.shape[1])
+                partition.add(vectors[positions])
+            slug = re.sub(r"[^\w-]+", "_", doc_type)
+            file_name = os.path.join(PARTITIONS_DIR, f"type-{slug}.faiss")
+            faiss.write_index(partition, os.path.join(db_path, file_name))
+            centroid = vectors[positions].mean(axis=0)
+            types[doc_type] = {"file": file_name, "positions": positions,
+                               "centroid": (centroid / (np.linalg.norm(centroid) or 1.0)).tolist()}
+            for start, position in enumerate(positions):
+                source_slice = sources[source_of[position]]["slices"].setdefault(doc_type, [start, 0])
+                source_slice[1] += 1
+
+        with open(os.path.join(db_path, PARTITIONS_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"version": PARTITIONS_VERSION, "types": types, "sources": sources}, f)
+
+
+class PartitionIndex:
+    """Per-type flat indexes (memory-mapped) and per-source slices of them"""
+    def __init__(self, db_path, data):
+        self.db_path = db_path
+        self.types = data["types"]
+        self.sources = data["sources"]
+        self.indexes = {}
+
+    @classmethod
+    def load(cls, db_path):
+        """Load the partitions saved next to the index, or None if the build wrote none"""
+        # Partition files are opened lazily, so pin the index version db_path points at now
+        db_path = os.path.realpath(db_path)
+        try:
+            with open(os.path.join(db_path, PARTITIONS_FILE), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if data.get("version") != PARTITIONS_VERSION:
+            return None
+        return cls(db_path, data)
+
+    def index(self, doc_type):
+        partition = self.indexes.get(doc_type)
+        if partition is None:
+            partition = faiss.read_index(os.path.join(self.db_path, self.types[doc_type]["file"]), MMAP_FLAGS)
+            self.indexes[doc_type] = partition
+        return partition
+
+    def search(self, query_vector, route, k):
+        """(global position, squared L2 distance) pairs of the k nearest vectors inside the routed partitions"""
+        query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        hits = []
+        if route.sources:
+            for source in route.sources:
+                for doc_type, (start, count) in self.sources[source]["slices"].items():
+                    vectors = self.index(doc_type).reconstruct_n(start, count)
+                    distances = ((vectors - query) ** 2).sum(axis=1)
+                    positions = self.types[doc_type]["positions"][start:start + count]
+                    hits.extend(zip(positions, distances.tolist()))
+        else:
+            for doc_type in route.types:
+                distances, ids = self.index(doc_type).search(query, k)
+                positions = self.types[doc_type]["positions"]
+                hits.extend((positions[i], float(d)) for d, i in zip(distances[0], ids[0]) if i >= 0)
+        return sorted(hits, key=lambda hit: hit[1])[:k]
+
+
+class QueryRouter:
+    """Picks the partitions a query should search: keywords first, then type centroids.
+
+    A query naming a source (e.g. a company) goes to that source's slice;
+    keyword matches go to their types; otherwise the query is routed by
+    embedding only when one type's centroid is clearly closest. Keyword and
+    centroid routes also search every type no keyword points at. Anything
+    else searches the whole index (route() returns None).
+    """
+    def __init__(self, partitions, centroid_margin=CENTROID_MARGIN):
+        self.partitions = partitions
+        self.centroid_margin = centroid_margin
+        self.source_names = {
+            f" {normalize_words(entry['name']).strip()} ": source
+            for source, entry in partitions.sources.items()
+            if entry["name"] and NAMED_SOURCE_TYPES.intersection(entry["slices"])
+        }
+        names = list(partitions.types)
+        self.type_names = names
+        self.catch_all_types = {name for name in names if name not in KEYWORD_TYPES}
+        self.centroids = np.array([partitions.types[name]["centroid"] for name in names], dtype=np.float32)
+
+    def route(self, query, query_vector):
+        words = normalize_words(query)
+        sources = [source for name, source in self.source_names.items() if name in words]
+        if sources:
+            return Route(sorted({doc_type for s in sources for doc_type in self.partitions.sources[s]["slices"]}),
+                         sources)
+
+        types = {doc_type for doc_type, keywords in TYPE_KEYWORDS.items()
+                 if any(f" {keyword} " in words for keyword in keywords)}
+        if types & JOB_TYPES:
+            types.add("jobs")
+        types &= set(self.type_names)
+        if types:
+            return Route(sorted(types | self.catch_all_types), None)
+
+        if len(self.type_names) > 1:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            similarities = self.centroids @ (vector / (np.linalg.norm(vector) or 1.0))
+            best, second = np.argsort(similarities)[::-1][:2]
+            if similarities[best] - similarities[second] >= self.centroid_margin:
+                return Route(sorted({self.type_names[best]} | self.catch_all_types), None)
+        return None
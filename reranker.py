@@ -0,0 +1,191 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, List
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+import tracing
+
+# Constants
+RERANK_ENABLED = os.environ.get("ASHA_RERANK", "").lower() in ("1", "true", "yes")
+RERANK_MODEL_NAME = os.environ.get("ASHA_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_FETCH_K = 30
+RERANK_MAX_LENGTH = 192  # query + chunk tokens; a 500-character chunk is ~120 tokens
+RERANK_MAX_QUERY_TOKENS = 48
+RERANK_LATENCY_BUDGET_MS = 60.0
+TOKEN_CACHE_SIZE = 4096  # tokenized chunks kept in memory
+LATENCY_SMOOTHING = 0.2  # weight of the newest measurement in the per-pair cost estimate
+
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a small cross-encoder in one batched CPU forward pass.
+
+    Chunks are tokenized once and kept in an LRU keyed by chunk_id, so only
+    the query is tokenized per call. A running per-pair cost estimate keeps
+    each call within the latency budget: when all candidates would not fit,
+    only the best-ranked ones that do are rescored, and if fewer than two fit
+    reranking is skipped.
+    """
+    def __init__(self, model_name=RERANK_MODEL_NAME, max_length=RERANK_MAX_LENGTH,
+                 latency_budget_ms=RERANK_LATENCY_BUDGET_MS, cache_size=TOKEN_CACHE_SIZE):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.latency_budget_ms = latency_budget_ms
+        self.cache_size = cache_size
+        self.tokens = OrderedDict()
+        self.lock = threading.Lock()
+        self._model = None
+        self._tokenizer = None
+        self._torch = None
+        self._template = None
+        self.available = None  # unknown until the model is first loaded
+        self.ms_per_pair = None
+        self.calls = 0
+        self.skipped = 0
+        self.token_hits = 0
+        self.token_misses = 0
+
+    def load(self):
+        """Load the tokenizer and model once; returns False if they cannot be loaded"""
+        if self.available is None:
+            with self.lock:
+                if self.available is None:
+                    try:
+                        import torch
+                        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+                        self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                        self._model = AutoModelForSequenceClassification.from_pretrained(self.model_name).eval()
+                        self._torch = torch
+                        self._template = self._pair_template()
+                        self.available = True
+                    except Exception as e:
+                        print(f"Could not load the reranker {self.model_name} ({type(e).__name__}: {e}); "
+                              f"serving retrieval order")
+                        self.available = False
+        return self.available
+
+    def _pair_template(self):
+        """Special tokens and token types around a (query, chunk) pair, e.g. [CLS] q [SEP] c [SEP].
+
+        Read off one encoded probe pair, so pre-tokenized ids can be assembled
+        without re-tokenizing the chunk text.
+        """
+        tokenizer = self._tokenizer
+        probe = tokenizer("a", "b", return_token_type_ids=True)
+        ids = probe["input_ids"]
+        types = probe.get("token_type_ids") or [0] * len(ids)
+        first = tokenizer("a", add_special_tokens=False)["input_ids"]
+        second = tokenizer("b", add_special_tokens=False)["input_ids"]
+        start = next(i for i in range(len(ids)) if ids[i:i + len(first)] == first)
+        middle = start + len(first)
+        end = next(i for i in range(middle, len(ids)) if ids[i:i + len(second)] == second)
+        return {
+            "prefix": ids[:start], "middle": ids[middle:end], "suffix": ids[end + len(second):],
+            "types": (types[0], types[start], types[middle], types[end], types[-1]),
+        }
+
+    def _chunk_tokens(self, doc):
+        key = doc.metadata.get("chunk_id") or doc.page_content
+        with self.lock:
+            tokens = self.tokens.get(key)
+            if tokens is not None:
+                self.tokens.move_to_end(key)
+                self.token_hits += 1
+                return tokens
+        tokens = self._tokenizer(doc.page_content, add_special_tokens=False, truncation=True,
+                                 max_length=self.max_length)["input_ids"]
+        with self.lock:
+            self.token_misses += 1
+            self.tokens[key] = tokens
+            while len(self.tokens) > self.cache_size:
+                self.tokens.popitem(last=False)
+        return tokens
+
+    def score(self, query, documents):
+        """Relevance logits of each document for the query, from one padded batch"""
+        tokenizer = self._tokenizer
+        query_tokens = tokenizer(query, add_special_tokens=False, truncation=True,
+                                 max_length=RERANK_MAX_QUERY_TOKENS)["input_ids"]
+        template = self._template
+        prefix_type, query_type, middle_type, chunk_type, suffix_type = template["types"]
+        head = template["prefix"] + query_tokens + template["middle"]
+        head_types = ([prefix_type] * len(template["prefix"]) + [query_type] * len(query_tokens)
+                      + [middle_type] * len(template["middle"]))
+        room = self.max_length - len(head) - len(template["suffix"])
+        rows = []
+        for doc in documents:
+            chunk_tokens = self._chunk_tokens(doc)[:room]
+            rows.append((head + chunk_tokens + template["suffix"],
+                         head_types + [chunk_type] * len(chunk_tokens) + [suffix_type] * len(template["suffix"])))
+
+        width = max(len(ids) for ids, _ in rows)
+        input_ids = np.full((len(rows), width), tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        token_type_ids = np.zeros((len(rows), width), dtype=np.int64)
+        for i, (ids, types) in enumerate(rows):
+            input_ids[i, :len(ids)] = ids
+            attention_mask[i, :len(ids)] = 1
+            token_type_ids[i, :len(types)] = types
+
+        torch = self._torch
+        inputs = {"input_ids": torch.from_numpy(input_ids), "attention_mask": torch.from_numpy(attention_mask)}
+        if "token_type_ids" in tokenizer.model_input_names:
+            inputs["token_type_ids"] = torch.from_numpy(token_type_ids)
+        with torch.inference_mode():
+            logits = self._model(**inputs).logits
+        return logits[:, 0].float().numpy()
+
+    def rerank(self, query, documents, top_n):
+        """The top_n documents by cross-encoder score, or the first top_n unchanged when reranking is skipped"""
+        candidates = len(documents)
+        if self.ms_per_pair:
+            candidates = min(candidates, int(self.latency_budget_ms / self.ms_per_pair))
+        if candidates < 2 or not self.load():
+            self.skipped += 1
+            if self.ms_per_pair:
+                # Relax the estimate so a slow spell (e.g. a busy CPU) does not disable reranking for good
+                self.ms_per_pair *= 1 - LATENCY_SMOOTHING
+            return documents[:top_n]
+
+        start = time.perf_counter()
+        scores = self.score(query, documents[:candidates])
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        per_pair = elapsed_ms / candidates
+        self.ms_per_pair = per_pair if self.ms_per_pair is None else (
+            LATENCY_SMOOTHING * per_pair + (1 - LATENCY_SMOOTHING) * self.ms_per_pair)
+        self.calls += 1
+
+        order = np.argsort(-scores, kind="stable")
+        return ([documents[i] for i in order] + documents[candidates:])[:top_n]
+
+
+class RerankRetriever(BaseRetriever):
+    """Over-fetches from a retriever and keeps the top_n chunks by cross-encoder score"""
+    retriever: Any
+    reranker: Any
+    top_n: int = 5
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.rerank(query, self.retriever.invoke(query))
+
+    def rerank(self, query, documents):
+        with tracing.span("rerank", candidates=len(documents)) as rerank_span:
+            skipped = self.reranker.skipped
+            reranked = self.reranker.rerank(query, documents, self.top_n)
+            rerank_span.set(skipped=self.reranker.skipped > skipped)
+        return reranked
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+def get_reranker():
+    """Shared cross-encoder reranker; the model loads on first use"""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = CrossEncoderReranker()
+        return _reranker
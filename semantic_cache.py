@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Constants
+DB_FAISS_PATH = "vectorstore/db_faiss"
+SIMILARITY_THRESHOLD = 0.9  # cosine similarity needed to reuse an answer
+MAX_ENTRIES = 512
+TTL_SECONDS = 6 * 3600
+
+
+class SemanticCache:
+    """Answer cache keyed on query meaning rather than exact text.
+
+    Queries are embedded with the same model as the vectorstore and compared
+    against previously answered ones with cosine similarity. Entries expire
+    after a TTL, the least recently used ones are dropped beyond MAX_ENTRIES,
+    and the whole cache is cleared whenever the FAISS index on disk changes.
+    """
+    def __init__(self, embedding_model, db_path=DB_FAISS_PATH, threshold=SIMILARITY_THRESHOLD,
+                 max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.embedding_model = embedding_model
+        self.db_path = db_path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.matrix = None  # stacked vectors of self.entries, rebuilt lazily
+        self.matrix_keys = []
+        self.next_key = 0
+        self.index_fingerprint = self._fingerprint()
+        self.hits = 0
+        self.misses = 0
+
+    def _fingerprint(self):
+        """Identify the index build on disk; a rebuild swaps in a new file"""
+        try:
+            stat = os.stat(os.path.join(self.db_path, "index.faiss"))
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _embed(self, query, vector=None):
+        if vector is None:
+            vector = self.embedding_model.embed_query(query)
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self):
+        """Drop expired entries and everything cached against an older index (lock held)"""
+        fingerprint = self._fingerprint()
+        if fingerprint != self.index_fingerprint:
+            self.entries.clear()
+            self.index_fingerprint = fingerprint
+            self.matrix = None
+            return
+        now = time.time()
+        expired = [key for key, entry in self.entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self.matrix = None
+
+    def lookup(self, query, vector=None):
+        """Return (cached entry or None, query vector); the vector can be passed on to store().
+
+        An already computed (unnormalized) embedding of the query can be passed as vector.
+        """
+        vector = self._embed(query, vector)
+        with self.lock:
+            self._expire()
+            if not self.entries:
+                self.misses += 1
+                return None, vector
+            if self.matrix is None:
+                self.matrix_keys = list(self.entries)
+                self.matrix = np.vstack([self.entries[key]["vector"] for key in self.matrix_keys])
+            similarities = self.matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None, vector
+            key = self.matrix_keys[best]
+            self.entries.move_to_end(key)
+            self.hits += 1
+            entry = self.entries[key]
+            return {
+                "answer": entry["answer"],
+                "source_documents": entry["source_documents"],
+                "similarity": float(similarities[best]),
+            }, vector
+
+    def store(self, query, answer, source_documents, vector=None):
+        """Remember the answer and sources for a query"""
+        if vector is None:
+            vector = self._embed(query)
+        with self.lock:
+            self._expire()
+            self.entries[self.next_key] = {
+                "query": query,
+                "vector": vector,
+                "answer": answer,
+                "source_documents": list(source_documents),
+                "created_at": time.time(),
+            }
+            self.next_key += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.matrix = None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.matrix = None
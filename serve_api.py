@@ -0,0 +1,303 @@
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from analytics_store import ANALYTICS_DB, LEGACY_ANALYTICS_FILE, AnalyticsStore
+from bias_filter import OUTPUT_BLOCKED_MESSAGE, detect_bias, output_screen, screen_output
+from conversation_memory import SessionMemories
+from connect_memory_with_llm import (build_prompt, configure_http_pool, get_faq_index, get_qa_chain, get_semantic_cache,
+                                     get_vectorstore)
+from hybrid_retrieval import retrieve_by_vector
+
+# Constants
+EMBED_MAX_BATCH = 32
+EMBED_MAX_WAIT = 0.01  # seconds a query waits for others to share its embedding batch
+MAX_CONCURRENT_LLM_CALLS = 8
+MAX_WAITING_LLM_CALLS = 64  # beyond this, new chats get 503 instead of queueing
+BIAS_MESSAGE = "Asha promotes positive and empowering conversations!"
+EMPTY_ANSWER = ("I'm sorry, I couldn't find detailed job listings right now. "
+                "You can explore [HerKey Jobs](https://www.herkey.com/jobs) directly!")
+
+
+class QueryEmbeddingBatcher:
+    """Collects query embeddings from concurrent requests into short time-windowed batches.
+
+    The first query of a batch waits at most max_wait for others to join; while
+    a batch is being encoded on a worker thread, new queries queue up for the
+    next one, so batches grow by themselves under load. Queries already in the
+    QueryEmbedder's LRU skip the model.
+    """
+    def __init__(self, embedding_model, max_batch=EMBED_MAX_BATCH, max_wait=EMBED_MAX_WAIT):
+        self.embedding_model = embedding_model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.queries = 0
+
+    async def embed(self, text):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                vectors = await run_in_threadpool(self.embedding_model.embed_queries, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.queries += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                # The request may have been cancelled while it waited
+                if not future.done():
+                    future.set_result(vector)
+
+
+class LLMLimiter:
+    """Caps concurrent LLM calls and rejects new work once too many requests are waiting"""
+    def __init__(self, max_concurrent=MAX_CONCURRENT_LLM_CALLS, max_waiting=MAX_WAITING_LLM_CALLS):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.active = 0
+
+    def check(self):
+        """Fail fast with 503 when the wait queue is full"""
+        if self.waiting >= self.max_waiting:
+            raise HTTPException(status_code=503, detail="Asha is busy, please retry shortly",
+                                headers={"Retry-After": "1"})
+
+    async def acquire(self, reject_when_full=True):
+        if reject_when_full:
+            self.check()
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self.semaphore.release()
+
+
+class ChatRequest(BaseModel):
+    """Pass the returned session_id back to have follow-up questions answered in context"""
+    query: str
+    session_id: Optional[str] = None
+    stream: bool = False
+
+
+class RetrieveRequest(BaseModel):
+    query: str
+
+
+class SourceDocument(BaseModel):
+    content: str
+    metadata: dict
+
+
+class RetrieveResponse(BaseModel):
+    documents: List[SourceDocument]
+    latency_ms: float
+
+
+class ChatResponse(BaseModel):
+    answer: str
+    sources: List[str]
+    session_id: str
+    cached: bool = False
+    latency_ms: float
+
+
+def unique_sources(source_documents):
+    return list(dict.fromkeys(doc.metadata.get('source', 'Unknown') for doc in source_documents))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load the shared vectorstore and chain once, before serving
+    configure_http_pool(async_pool_size=MAX_CONCURRENT_LLM_CALLS)
+    qa_chain = await run_in_threadpool(get_qa_chain)
+    vectorstore = get_vectorstore()
+    app.state.qa_chain = qa_chain
+    app.state.semantic_cache = get_semantic_cache()
+    app.state.faq_index = get_faq_index()
+    app.state.analytics = AnalyticsStore(ANALYTICS_DB, legacy_file=LEGACY_ANALYTICS_FILE)
+    app.state.batcher = QueryEmbeddingBatcher(vectorstore.embeddings)
+    app.state.limiter = LLMLimiter()
+    app.state.memories = SessionMemories()
+    batcher_task = asyncio.create_task(app.state.batcher.run())
+    try:
+        yield
+    finally:
+        batcher_task.cancel()
+        await run_in_threadpool(app.state.analytics.flush)
+
+
+app = FastAPI(title="Asha API", lifespan=lifespan)
+
+
+async def retrieve(query):
+    """Embed the query in a shared micro-batch, then search on a worker thread"""
+    vector = await app.state.batcher.embed(query)
+    documents = await run_in_threadpool(retrieve_by_vector, app.state.qa_chain.retriever, query, vector)
+    return vector, documents
+
+
+@app.get("/health")
+async def health():
+    batcher = app.state.batcher
+    limiter = app.state.limiter
+    return {
+        "status": "ok",
+        "vectors": int(get_vectorstore().index.ntotal),
+        "llm_active": limiter.active,
+        "llm_waiting": limiter.waiting,
+        "llm_max_concurrent": limiter.max_concurrent,
+        "embed_batches": batcher.batches,
+        "embed_avg_batch": batcher.queries / batcher.batches if batcher.batches else 0.0,
+        "faq_hits": app.state.faq_index.hits,
+    }
+
+
+@app.post("/retrieve", response_model=RetrieveResponse)
+async def retrieve_endpoint(request: RetrieveRequest):
+    start = time.perf_counter()
+    _, documents = await retrieve(request.query)
+    return RetrieveResponse(
+        documents=[SourceDocument(content=doc.page_content, metadata=doc.metadata) for doc in documents],
+        latency_ms=(time.perf_counter() - start) * 1000,
+    )
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    """Answer a question; with stream=true the response is NDJSON: sources, tokens, then done.
+
+    A streamed answer that fails the output screen ends with {"replace": ...}
+    instead, carrying the text to show in place of the tokens so far.
+    """
+    start = time.perf_counter()
+    session_id = request.session_id or uuid.uuid4().hex
+    analytics = app.state.analytics
+    if detect_bias(request.query):
+        # Analytics may flush to SQLite, so it never runs on the event loop
+        await run_in_threadpool(analytics.record_bias, session_id, request.query)
+        raise HTTPException(status_code=400, detail=BIAS_MESSAGE)
+
+    memory = app.state.memories.get(session_id)
+    # Follow-ups are looked up and retrieved by their standalone rewrite
+    standalone_query = memory.standalone_query(request.query)
+    # Precomputed answers to frequent queries need no embedding at all; the lookup may reload the FAQ file
+    cached = await run_in_threadpool(app.state.faq_index.lookup, standalone_query, get_vectorstore())
+    if cached is None:
+        vector = await app.state.batcher.embed(standalone_query)
+        cached, cache_vector = app.state.semantic_cache.lookup(standalone_query, vector=vector)
+    if cached is not None:
+        memory.update(request.query, standalone_query, cached["answer"])
+        sources = unique_sources(cached["source_documents"])
+        await run_in_threadpool(analytics.record_question, session_id, request.query,
+                                (time.perf_counter() - start) * 1000, sources, standalone=standalone_query)
+        response = ChatResponse(answer=cached["answer"], sources=sources, session_id=session_id, cached=True,
+                                latency_ms=(time.perf_counter() - start) * 1000)
+        if not request.stream:
+            return response
+        return StreamingResponse(iter([
+            json.dumps({"sources": sources, "session_id": session_id}) + "\n",
+            json.dumps({"token": cached["answer"]}) + "\n",
+            json.dumps({"done": True, "cached": True}) + "\n",
+        ]), media_type="application/x-ndjson")
+
+    qa_chain = app.state.qa_chain
+    source_documents = await run_in_threadpool(retrieve_by_vector, qa_chain.retriever, standalone_query, vector)
+    prompt_text = build_prompt(qa_chain, memory.prompt_question(request.query), source_documents)
+    sources = unique_sources(source_documents)
+    llm = qa_chain.combine_documents_chain.llm_chain.llm
+    limiter = app.state.limiter
+
+    async def finish(answer, blocked=False):
+        memory.update(request.query, standalone_query, answer)
+        if answer.strip() and not blocked:
+            app.state.semantic_cache.store(standalone_query, answer, source_documents, vector=cache_vector)
+        await run_in_threadpool(analytics.record_question, session_id, request.query,
+                                (time.perf_counter() - start) * 1000, sources, standalone=standalone_query)
+
+    if not request.stream:
+        # Waits for a free LLM slot, or fails fast with 503 when the wait queue is full
+        await limiter.acquire()
+        try:
+            answer = await llm.ainvoke(prompt_text)
+        finally:
+            limiter.release()
+        if screen_output(answer):
+            answer = OUTPUT_BLOCKED_MESSAGE
+            await finish(answer, blocked=True)
+        else:
+            await finish(answer)
+        return ChatResponse(answer=answer.strip() or EMPTY_ANSWER, sources=sources, session_id=session_id,
+                            latency_ms=(time.perf_counter() - start) * 1000)
+
+    async def stream_tokens():
+        answer = ""
+        # Screened token by token; a match stops generation and tells the client to replace the answer
+        screen = output_screen()
+        yield json.dumps({"sources": sources, "session_id": session_id}) + "\n"
+        # The slot is taken only once the body is being sent, so a response that is never iterated holds none
+        await limiter.acquire(reject_when_full=False)
+        try:
+            async for token in llm.astream(prompt_text):
+                if screen.feed(token):
+                    break
+                answer += token
+                yield json.dumps({"token": token}) + "\n"
+        finally:
+            # Also runs when the client disconnects mid-stream
+            limiter.release()
+        if screen.match or screen.finish():
+            yield json.dumps({"replace": OUTPUT_BLOCKED_MESSAGE}) + "\n"
+            await finish(OUTPUT_BLOCKED_MESSAGE, blocked=True)
+            yield json.dumps({"done": True, "cached": False, "blocked": True}) + "\n"
+            return
+        if not answer.strip():
+            yield json.dumps({"token": EMPTY_ANSWER}) + "\n"
+        await finish(answer)
+        yield json.dumps({"done": True, "cached": False}) + "\n"
+
+    limiter.check()
+    return StreamingResponse(stream_tokens(), media_type="application/x-ndjson")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Serve Asha's chat and retrieval endpoints over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    # One process serves many concurrent sessions; run several behind a load balancer to scale out
+    uvicorn.run(app, host=args.host, port=args.port)
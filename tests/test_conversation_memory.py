@@ -0,0 +1,44 @@
+from conversation_memory import ConversationMemory
+
+
+def ask(memory, query, answer="Here's what I found to help you with that question today, with several options."):
+    standalone = memory.standalone_query(query)
+    memory.update(query, standalone, answer)
+    return standalone
+
+
+def test_follow_up_merges_with_previous_question():
+    memory = ConversationMemory()
+    ask(memory, "Engineering jobs in Pune")
+    assert ask(memory, "what about remote ones?") == "remote engineering jobs pune"
+
+
+def test_topic_change_is_not_rewritten():
+    memory = ConversationMemory()
+    ask(memory, "Engineering jobs in Pune")
+    ask(memory, "what about remote ones?")
+    question = "Is there any mentorship program for women returning after a career break?"
+    assert ask(memory, question) == question
+    assert ask(memory, "Tell me about JSW") == "Tell me about JSW"
+
+
+def test_incidental_there_and_it_do_not_make_a_follow_up():
+    memory = ConversationMemory()
+    ask(memory, "Engineering jobs in Pune")
+    for question in ["Are there data science internships in Mumbai?", "Is it possible to switch careers at 40?",
+                     "Tell me more about leadership programs", "That sounds great, any resume tips?"]:
+        assert memory.standalone_query(question) == question
+
+
+def test_follow_up_chain_does_not_accumulate_topics():
+    memory = ConversationMemory()
+    ask(memory, "Engineering jobs in Pune")
+    ask(memory, "what about remote ones?")
+    assert ask(memory, "what about part-time ones?") == "part-time engineering jobs pune"
+    ask(memory, "Mentorship programs for women")
+    assert ask(memory, "what else is there?") == "mentorship programs women"
+
+
+def test_first_message_is_never_a_follow_up():
+    memory = ConversationMemory()
+    assert memory.standalone_query("what about those?") == "what about those?"
@@ -0,0 +1,60 @@
+import numpy as np
+from embedding_service import EmbeddingCache, text_hash
+
+DIM = 4
+
+
+def vectors(*values):
+    return np.array([[value] * DIM for value in values], dtype=np.float32)
+
+
+def assert_cached(cache, expected):
+    found = cache.get_many([text_hash(text) for text in expected])
+    for text, value in expected.items():
+        assert np.array_equal(found[text_hash(text)], np.full(DIM, value, dtype=np.float32))
+
+
+def test_round_trip(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many([text_hash("a"), text_hash("b")], vectors(1, 2))
+    reopened = EmbeddingCache(str(tmp_path))
+    assert len(reopened) == 2
+    assert_cached(reopened, {"a": 1, "b": 2})
+
+
+def test_interrupted_append_does_not_shift_later_keys(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many([text_hash("a"), text_hash("b")], vectors(1, 2))
+    # Crash after the vector rows were written but before (all of) their keys
+    with open(cache.vectors_path, 'ab') as f:
+        f.write(vectors(9, 9).tobytes())
+    with open(cache.keys_path, 'a') as f:
+        f.write(text_hash("lost")[:10])
+
+    reopened = EmbeddingCache(str(tmp_path))
+    assert len(reopened) == 2
+    reopened.put_many([text_hash("c")], vectors(3))
+    assert_cached(reopened, {"a": 1, "b": 2, "c": 3})
+    assert_cached(EmbeddingCache(str(tmp_path)), {"a": 1, "b": 2, "c": 3})
+
+
+def test_append_repairs_a_crash_in_another_process(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many([text_hash("a")], vectors(1))
+    # Another writer sharing the directory died mid-append after this cache loaded
+    with open(cache.vectors_path, 'ab') as f:
+        f.write(vectors(9).tobytes()[:DIM * 2])
+    cache.put_many([text_hash("b")], vectors(2))
+    assert_cached(cache, {"a": 1, "b": 2})
+    assert_cached(EmbeddingCache(str(tmp_path)), {"a": 1, "b": 2})
+
+
+def test_keys_without_vector_rows_are_dropped(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many([text_hash("a"), text_hash("b")], vectors(1, 2))
+    with open(cache.vectors_path, 'r+b') as f:
+        f.truncate(DIM * 4 + 3)
+    reopened = EmbeddingCache(str(tmp_path))
+    assert len(reopened) == 1
+    reopened.put_many([text_hash("b")], vectors(2))
+    assert_cached(EmbeddingCache(str(tmp_path)), {"a": 1, "b": 2})
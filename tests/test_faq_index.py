@@ -0,0 +1,42 @@
+from langchain_core.documents import Document
+from faq_index import FaqIndex, entry_key, faq_key, prompt_id, write_faq_index
+
+APP_TEMPLATE = "App persona. Context: {context} Question: {question}"
+API_TEMPLATE = "API persona. Context: {context} Question: {question}"
+
+
+class Docstore:
+    def search(self, chunk_id):
+        return Document(page_content=chunk_id) if chunk_id == "c1" else f"ID {chunk_id} not found."
+
+
+class Vectorstore:
+    docstore = Docstore()
+
+
+def entry(template, query, answer, chunk_ids=("c1",)):
+    key = faq_key(query)
+    return entry_key(prompt_id(template), key), {"key": key, "prompt_id": prompt_id(template), "query": query,
+                                                 "answer": answer, "chunk_ids": list(chunk_ids), "count": 3}
+
+
+def test_answers_are_only_served_with_their_prompt_template(tmp_path):
+    path = str(tmp_path / "faq_index.json")
+    write_faq_index(dict([entry(APP_TEMPLATE, "Remote jobs for women?", "app answer"),
+                          entry(API_TEMPLATE, "Remote jobs for women?", "api answer"),
+                          entry(API_TEMPLATE, "Mentorship programs", "api only")]), path)
+    vectorstore = Vectorstore()
+
+    app = FaqIndex(APP_TEMPLATE, path)
+    assert app.lookup("what are some remote jobs for women", vectorstore)["answer"] == "app answer"
+    assert app.lookup("Mentorship programs", vectorstore) is None
+    api = FaqIndex(API_TEMPLATE, path)
+    assert api.lookup("remote jobs for women", vectorstore)["answer"] == "api answer"
+    assert api.lookup("Mentorship programs", vectorstore)["answer"] == "api only"
+    assert FaqIndex("Another template {context} {question}", path).lookup("Mentorship programs", vectorstore) is None
+
+
+def test_entries_with_a_missing_chunk_are_not_served(tmp_path):
+    path = str(tmp_path / "faq_index.json")
+    write_faq_index(dict([entry(APP_TEMPLATE, "Remote jobs", "stale", chunk_ids=("c1", "gone"))]), path)
+    assert FaqIndex(APP_TEMPLATE, path).lookup("Remote jobs", Vectorstore()) is None
@@ -0,0 +1,33 @@
+import os
+import pytest
+from create_memory_for_asha import WebContentScraper
+
+URL = "https://example.com/jobs"
+
+
+def scraper_with_page(tmp_path):
+    scraper = WebContentScraper(cache_dir=str(tmp_path))
+    _, meta_file, _ = scraper._cache_paths(URL)
+    scraper._save_meta(meta_file, {"url": URL, "content_hash": "h1"})
+    return scraper
+
+
+def test_extracted_text_round_trip(tmp_path):
+    scraper = scraper_with_page(tmp_path)
+    scraper.save_extracted(URL, "h1", None, "Remote engineering jobs")
+    assert scraper.load_extracted(URL, "h1") == "Remote engineering jobs"
+    assert scraper.load_extracted(URL, "h2") is None
+    assert not [name for name in os.listdir(tmp_path) if ".tmp" in name]
+
+
+def test_interrupted_write_keeps_the_previous_text(tmp_path, monkeypatch):
+    scraper = scraper_with_page(tmp_path)
+    scraper.save_extracted(URL, "h1", None, "Remote engineering jobs")
+
+    def crash(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, "replace", crash)
+    with pytest.raises(OSError):
+        scraper.save_extracted(URL, "h1", ["main"], "Partial")
+    monkeypatch.undo()
+    assert scraper.load_extracted(URL, "h1") == "Remote engineering jobs"
@@ -0,0 +1,103 @@
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from partition_index import PartitionBuilder, PartitionIndex, QueryRouter, Route
+
+DIM = 8
+
+
+def chunk(source, doc_type, title=""):
+    return Document(page_content=source, metadata={"source": source, "type": doc_type, "title": title})
+
+
+def build(tmp_path, chunks):
+    vectors = np.random.default_rng(0).normal(size=(len(chunks), DIM)).astype(np.float32)
+    index = faiss.IndexFlatL2(DIM)
+    index.add(vectors)
+    builder = PartitionBuilder()
+    builder.add(0, chunks)
+    builder.save(str(tmp_path), index)
+    return PartitionIndex.load(str(tmp_path)), vectors
+
+
+def test_source_with_chunks_of_several_types_searches_all_of_them(tmp_path):
+    # JSW's chunks are tagged "company" and "jobs", interleaved with another source's
+    chunks = [chunk("jsw", "company", "JSW – Opportunities for Women"), chunk("other", "jobs"),
+              chunk("jsw", "jobs"), chunk("other", "company", "Other – Careers"), chunk("jsw", "company"),
+              chunk("jsw", "jobs")]
+    partitions, vectors = build(tmp_path, chunks)
+
+    hits = partitions.search(vectors[2], Route(["company", "jobs"], ["jsw"]), k=10)
+    assert sorted(position for position, _ in hits) == [0, 2, 4, 5]
+    for position, distance in hits:
+        assert np.isclose(distance, ((vectors[position] - vectors[2]) ** 2).sum(), atol=1e-4)
+
+    route = QueryRouter(partitions).route("Tell me about JSW", vectors[0])
+    assert route == Route(["company", "jobs"], ["jsw"])
+
+
+def keyword_partitions(tmp_path):
+    chunks = [chunk("herkey", "homepage"), chunk("jobs", "jobs"), chunk("pune", "location"), chunk("wfh", "remote"),
+              chunk("blog", "general"), chunk("jobs", "jobs")]
+    return build(tmp_path, chunks)
+
+
+def test_keyword_routes_keep_the_catch_all_types(tmp_path):
+    partitions, vectors = keyword_partitions(tmp_path)
+    router = QueryRouter(partitions)
+    route = router.route("What roles suit someone after a career break?", vectors[0])
+    assert route == Route(["general", "homepage", "jobs"], None)
+    assert router.route("Remote jobs", vectors[0]) == Route(["general", "homepage", "jobs", "remote"], None)
+
+    # The broad advice in general/homepage chunks stays reachable from a routed search
+    hits = partitions.search(vectors[4], route, k=3)
+    assert hits[0][0] == 4
+    assert {position for position, _ in partitions.search(vectors[0], route, k=10)} == {0, 1, 4, 5}
+
+
+def test_query_without_keywords_or_a_clear_centroid_searches_everything(tmp_path):
+    partitions, vectors = keyword_partitions(tmp_path)
+    assert QueryRouter(partitions, centroid_margin=10.0).route("Hello Asha", vectors[0]) is None
+
+
+class StubVectorstore:
+    """Just enough of a FAISS vectorstore for HybridRetriever"""
+    def __init__(self, chunks, vectors):
+        self.chunks = chunks
+        self.vectors = vectors
+        self.full_searches = 0
+        self.index_to_docstore_id = {position: str(position) for position in range(len(chunks))}
+        self.docstore = self
+        self.embeddings = self
+
+    def embed_query(self, query):
+        return self.vectors[int(query.split()[-1])]
+
+    def search(self, doc_id):
+        return self.chunks[int(doc_id)]
+
+    def similarity_search_by_vector(self, vector, k, filter=None, fetch_k=None):
+        self.full_searches += 1
+        order = np.argsort(((self.vectors - np.asarray(vector)) ** 2).sum(axis=1))
+        return [self.chunks[position] for position in order[:k]]
+
+
+def test_routed_search_with_too_few_hits_falls_back_to_the_whole_index(tmp_path):
+    from hybrid_retrieval import BM25Index, HybridRetriever
+    chunks = [chunk("wfh", "remote"), chunk("herkey", "homepage"), chunk("jobs", "jobs"), chunk("pune", "location")]
+    partitions, vectors = build(tmp_path, chunks)
+    for position, doc in enumerate(chunks):
+        doc.metadata["chunk_id"] = str(position)
+    vectorstore = StubVectorstore(chunks, vectors)
+    retriever = HybridRetriever(vectorstore=vectorstore, bm25=BM25Index(), k=4, partitions=partitions,
+                                router=QueryRouter(partitions))
+
+    # "remote" routes to remote, jobs and homepage: 3 chunks, fewer than k
+    documents = retriever.invoke("remote work 3")
+    assert vectorstore.full_searches == 1
+    assert len(documents) == 4
+
+    retriever.k = 3
+    documents = retriever.invoke("remote work 3")
+    assert vectorstore.full_searches == 1
+    assert {doc.metadata["source"] for doc in documents} == {"wfh", "herkey", "jobs"}
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+# Constants
+TRACING_ENABLED = os.environ.get("ASHA_TRACING", "").lower() in ("1", "true", "yes")
+TRACE_FILE = os.environ.get("ASHA_TRACE_FILE")  # JSONL, one line per finished turn
+OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = "asha-chatbot"
+RECENT_TURNS = 50
+
+_enabled = TRACING_ENABLED
+_current_turn = contextvars.ContextVar("asha_trace_turn", default=None)
+_recent_turns = deque(maxlen=RECENT_TURNS)
+_lock = threading.Lock()
+_otel_tracer = None
+_otel_configured = False
+
+
+class _NoopSpan:
+    """Returned while tracing is off, so instrumented code costs one flag check"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Turn:
+    """Root of one traced unit of work (a chat turn); collects the spans opened inside it"""
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.spans = []
+        self.depth = 0
+        self.start = None
+        self.wall_start_ns = None
+        self.token = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.wall_start_ns = time.time_ns()
+        self.token = _current_turn.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self.start) * 1000
+        _current_turn.reset(self.token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        finish_turn({
+            "name": self.name,
+            "ts": self.wall_start_ns / 1e9,
+            "duration_ms": duration_ms,
+            "attributes": self.attributes,
+            "spans": self.spans,
+        }, self.wall_start_ns)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class Span:
+    """Timed section inside a turn"""
+    def __init__(self, turn, name, attributes):
+        self.turn = turn
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.turn.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.turn.depth -= 1
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.turn.spans.append({
+            "name": self.name,
+            "start_ms": (self.start - self.turn.start) * 1000,
+            "duration_ms": (end - self.start) * 1000,
+            "depth": self.turn.depth,
+            "attributes": self.attributes,
+        })
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(enabled):
+    """Turn tracing on or off for the whole process"""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def turn(name, **attributes):
+    """Context manager for a traced turn; spans opened inside it are attached to it"""
+    if not _enabled:
+        return NOOP_SPAN
+    return Turn(name, attributes)
+
+
+def span(name, **attributes):
+    """Context manager timing a section of the current turn.
+
+    Outside a turn the span is recorded as a turn of its own, so one-off
+    work such as loading the vectorstore still shows up.
+    """
+    if not _enabled:
+        return NOOP_SPAN
+    current = _current_turn.get()
+    if current is None:
+        return Turn(name, attributes)
+    return Span(current, name, attributes)
+
+
+def record(name, duration_s, **attributes):
+    """Attach an already measured duration (e.g. time summed over a loop) to the current turn"""
+    if not _enabled:
+        return
+    current = _current_turn.get()
+    if current is None:
+        return
+    current.spans.append({
+        "name": name,
+        "start_ms": None,
+        "duration_ms": duration_s * 1000,
+        "depth": current.depth,
+        "attributes": attributes,
+    })
+
+
+def recent_turns(limit=RECENT_TURNS):
+    """Most recent finished turns, newest first"""
+    with _lock:
+        return list(_recent_turns)[::-1][:limit]
+
+
+def finish_turn(trace, wall_start_ns):
+    with _lock:
+        _recent_turns.append(trace)
+        if TRACE_FILE:
+            with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(trace) + "\n")
+    tracer = _get_otel_tracer()
+    if tracer is not None:
+        _export_otel(tracer, trace, wall_start_ns)
+
+
+def _get_otel_tracer():
+    """Tracer exporting over OTLP/HTTP when an endpoint is configured and the SDK is installed"""
+    global _otel_tracer, _otel_configured
+    if _otel_configured:
+        return _otel_tracer
+    with _lock:
+        if not _otel_configured:
+            _otel_configured = True
+            if otel_trace is not None and OTLP_ENDPOINT:
+                try:
+                    from opentelemetry.sdk.resources import Resource
+                    from opentelemetry.sdk.trace import TracerProvider
+                    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+                    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                except ImportError:
+                    print("opentelemetry-sdk or the OTLP exporter is not installed; not exporting traces")
+                else:
+                    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+                    # The exporter reads OTEL_EXPORTER_OTLP_ENDPOINT itself
+                    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+                    otel_trace.set_tracer_provider(provider)
+                    _otel_tracer = otel_trace.get_tracer("asha")
+    return _otel_tracer
+
+
+def _otel_attributes(attributes):
+    return {key: value if isinstance(value, (str, bool, int, float)) else json.dumps(value)
+            for key, value in attributes.items() if value is not None}
+
+
+def _export_otel(tracer, trace, wall_start_ns):
+    """Replay a finished turn as OpenTelemetry spans; spans are recorded cheaply and exported after the turn"""
+    end_ns = wall_start_ns + int(trace["duration_ms"] * 1e6)
+    root = tracer.start_span(trace["name"], start_time=wall_start_ns, attributes=_otel_attributes(trace["attributes"]))
+    context = otel_trace.set_span_in_context(root)
+    for item in trace["spans"]:
+        if item["start_ms"] is None:
+            # Aggregated durations have no start; place them at the end of the turn
+            start_ns = end_ns - int(item["duration_ms"] * 1e6)
+        else:
+            start_ns = wall_start_ns + int(item["start_ms"] * 1e6)
+        child = tracer.start_span(item["name"], context=context, start_time=start_ns,
+                                  attributes=_otel_attributes(item["attributes"]))
+        child.end(end_time=start_ns + int(item["duration_ms"] * 1e6))
+    root.end(end_time=end_ns)
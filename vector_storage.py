@@ -0,0 +1,146 @@
+import os
+import json
+import sqlite3
+import threading
+from collections.abc import Mapping
+import numpy as np
+import faiss
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+# Constants
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docs.sqlite"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+# Map flat vector codes straight from the file instead of copying them into RAM
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+
+
+class SQLiteDocstore(Docstore):
+    """Read-only docstore that loads chunk text and metadata lazily from SQLite.
+
+    Rows are keyed by their position in the FAISS index as well as by id, so
+    the vectorstore never needs the whole id mapping in memory. Each thread
+    gets its own read-only connection.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.connection = connection
+        return connection
+
+    def _document(self, row):
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def search(self, search):
+        row = self.connection.execute("SELECT page_content, metadata FROM docs WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return self._document(row)
+
+    def id_at(self, position):
+        row = self.connection.execute("SELECT id FROM docs WHERE pos = ?", (position,)).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def items(self):
+        """Iterate (id, Document) pairs in index order"""
+        for row in self.connection.execute("SELECT id, page_content, metadata FROM docs ORDER BY pos"):
+            yield row[0], self._document(row[1:])
+
+    def add(self, texts):
+        raise NotImplementedError("SQLiteDocstore is read-only; rebuild the vectorstore instead")
+
+    def delete(self, ids):
+        raise NotImplementedError("SQLiteDocstore is read-only; rebuild the vectorstore instead")
+
+
+class PositionMap(Mapping):
+    """index_to_docstore_id mapping backed by the SQLite docstore"""
+    def __init__(self, docstore):
+        self.docstore = docstore
+        self._len = docstore.count()
+
+    def __getitem__(self, position):
+        return self.docstore.id_at(int(position))
+
+    def __iter__(self):
+        return iter(range(self._len))
+
+    def __len__(self):
+        return self._len
+
+
+def create_docstore(path):
+    """Create an empty SQLite docstore, replacing any existing file"""
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE docs (pos INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, "
+                       "page_content TEXT NOT NULL, metadata TEXT NOT NULL)")
+    return connection
+
+
+class VectorstoreWriter:
+    """Streams chunks and their vectors into a vectorstore directory.
+
+    Vectors go into a flat FAISS index and chunks straight into the SQLite
+    docstore, so chunk text is never held in memory. close() writes the
+    index, optionally replaced by one built from it (e.g. an ANN index).
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(db_path, exist_ok=True)
+        self.connection = create_docstore(os.path.join(db_path, DOCSTORE_FILE))
+        self.index = None
+
+    def add(self, chunks, vectors, ids):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.index is None:
+            self.index = faiss.IndexFlatL2(vectors.shape[1])
+        start = self.index.ntotal
+        self.index.add(vectors)
+        self.connection.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", (
+            (start + offset, doc_id, chunk.page_content, json.dumps(chunk.metadata))
+            for offset, (doc_id, chunk) in enumerate(zip(ids, chunks))
+        ))
+
+    def __len__(self):
+        return self.index.ntotal if self.index is not None else 0
+
+    def close(self, index=None):
+        self.connection.commit()
+        self.connection.close()
+        index = index if index is not None else self.index
+        if index is not None:
+            faiss.write_index(index, os.path.join(self.db_path, INDEX_FILE))
+
+
+def load_vectorstore(db_path, embedding_model):
+    """Load a vectorstore written by VectorstoreWriter, or a legacy pickle-based one.
+
+    The vectors are memory-mapped and chunks read lazily, so startup cost does
+    not grow with the corpus and worker processes share the OS page cache.
+    A db_path symlink (see create_memory_for_asha.publish_index) is resolved
+    once here, so the loaded store keeps reading its own version after the
+    link moves on.
+    """
+    db_path = os.path.realpath(db_path)
+    docstore_path = os.path.join(db_path, DOCSTORE_FILE)
+    if not os.path.exists(docstore_path):
+        return FAISS.load_local(db_path, embedding_model, allow_dangerous_deserialization=True)
+
+    docstore = SQLiteDocstore(docstore_path)
+    index = faiss.read_index(os.path.join(db_path, INDEX_FILE), MMAP_FLAGS)
+    return FAISS(embedding_model, index, docstore, PositionMap(docstore))